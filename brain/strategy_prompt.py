@@ -14,6 +14,8 @@ Strategy Layer Prompt - The Boss
 6. 遇到重复任务使用 Python 的 for/while 循环配合 checkpoint
 """
 
+import functools
+
 STRATEGY_LAYER_SYSTEM_PROMPT = '''你是一个手机自动化脚本生成器。
 
 ## 🎯 你的角色
@@ -245,8 +247,9 @@ def get_strategy_prompt() -> str:
     return STRATEGY_LAYER_SYSTEM_PROMPT
 
 
+@functools.lru_cache(maxsize=256)
 def create_user_prompt(user_instruction: str) -> str:
-    """创建用户 Prompt
+    """创建用户 Prompt (按指令缓存)
     
     Args:
         user_instruction: 用户指令
@@ -13,8 +13,12 @@ Main Entry - The Pipeline (v3.2 with Cloud Skill System)
 """
 
 import os
+import re
 import sys
+import hashlib
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import Optional, Tuple
 
 # 项目路径
@@ -22,8 +26,11 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, PROJECT_ROOT)
 
 from drivers.base_driver import BaseDriver
-from tactical.autoglm_driver import AutoGLMDriver, SafetyError, MaxRetryError, StepResult
+from tactical.autoglm_driver import (
+    AutoGLMDriver, SafetyError, MaxRetryError, StepResult, get_zhipu_client
+)
 from runtime.task_runtime_v2 import TaskRuntime
+from runtime.code_cache import CodeCache
 from brain.strategy_prompt import get_strategy_prompt, create_user_prompt
 
 # 新的技能系统
@@ -45,6 +52,65 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# LLM 响应中可能包裹的 Markdown 代码块标记 (```python ... ```)
+_FENCE_RE = re.compile(r'^\s*(?:```(?:python)?)?\s*(.*?)\s*(?:```)?\s*$', re.DOTALL)
+
+# 应用名称识别 (按顺序匹配，命中第一个即停止)
+APP_KEYWORDS = {
+    "微信": ["微信", "社交"],
+    "支付宝": ["支付宝", "支付"],
+    "淘宝": ["淘宝", "购物"],
+    "抖音": ["抖音", "短视频"],
+    "微博": ["微博", "社交"],
+    "美团": ["美团", "外卖"],
+    "高德": ["高德", "导航"],
+    "地图": ["地图", "导航"],
+}
+
+# 动作识别
+ACTION_KEYWORDS = {
+    "发送": "发送",
+    "点赞": "点赞",
+    "评论": "评论",
+    "搜索": "搜索",
+    "打开": "打开",
+    "返回": "导航",
+}
+
+
+# 所有关键词合并为一个正则，一次扫描完成匹配
+_TAG_KEYWORDS_RE = re.compile(
+    "|".join(map(re.escape, [*APP_KEYWORDS, *ACTION_KEYWORDS]))
+)
+
+
+@functools.lru_cache(maxsize=256)
+def _extract_tags_cached(instruction: str) -> tuple:
+    """从指令中提取标签 (按指令缓存)"""
+    found = set(_TAG_KEYWORDS_RE.findall(instruction))
+    if not found:
+        return ()
+    
+    tags = set()
+    
+    for keyword, app_tags in APP_KEYWORDS.items():
+        if keyword in found:
+            tags.update(app_tags)
+            break
+    
+    for keyword, tag in ACTION_KEYWORDS.items():
+        if keyword in found:
+            tags.add(tag)
+    
+    return tuple(tags)
+
+
+def _stable_skill_id(instruction: str) -> str:
+    """根据指令生成稳定的技能 ID (不受 PYTHONHASHSEED 影响)"""
+    digest = hashlib.blake2s(instruction.encode('utf-8'), digest_size=5).hexdigest()
+    return f"skill_{digest}"
+
+
 class SemanticAgent:
     """语义代理 - 完整的三层架构 + 技能系统
     
@@ -67,6 +133,7 @@ class SemanticAgent:
         skill_store_path: str = "./skill_store",
         enable_skills: bool = True,
         skill_match_threshold: float = 0.7,
+        llm_cache_dir: Optional[str] = None,
         # 云端配置（可选）
         skill_api_url: Optional[str] = None,
         skill_api_key: Optional[str] = None,
@@ -82,6 +149,8 @@ class SemanticAgent:
             skill_store_path: 技能存储路径
             enable_skills: 是否启用技能系统
             skill_match_threshold: 技能匹配阈值 (0-1)
+            llm_cache_dir: LLM 生成代码的缓存目录 (默认 None 不缓存；
+                只缓存执行成功的代码，执行失败时删除对应条目)
             skill_api_url: 云端技能服务 URL（可选）
             skill_api_key: 云端技能服务 API Key（可选）
             device_id: 设备 ID（可选）
@@ -102,11 +171,22 @@ class SemanticAgent:
         self.runtime = TaskRuntime(self.autoglm_driver)
         
         # 初始化 L1 策略层客户端
+        # System Prompt 是静态的，预先计算一次 (其摘要用于代码缓存 key)
+        self._system_prompt = get_strategy_prompt()
+        self._sys_prompt_hash = hashlib.blake2b(
+            self._system_prompt.encode('utf-8'), digest_size=16
+        ).hexdigest()
+        self._system_msg = {"role": "system", "content": self._system_prompt}
         self.llm_client = None
         self._init_llm_client()
         
+        # LLM 生成代码缓存 (可选，重复指令不再调用 LLM)
+        self.code_cache = CodeCache(llm_cache_dir) if llm_cache_dir else None
+        
         # 初始化技能系统 v2
         self.skill_manager: Optional[SkillManager] = None
+        self._skill_executor: Optional[ThreadPoolExecutor] = None
+        self._pending_skill_work: Optional[Future] = None
         if enable_skills:
             self._init_skill_system(
                 skill_store_path,
@@ -127,8 +207,8 @@ class SemanticAgent:
     def _init_llm_client(self):
         """初始化 LLM 客户端"""
         try:
-            from zhipuai import ZhipuAI
-            self.llm_client = ZhipuAI(api_key=self.zhipuai_api_key)
+            # 与战术层共享同一个客户端（同一 API Key）
+            self.llm_client = get_zhipu_client(self.zhipuai_api_key)
             logger.info("[SemanticAgent] LLM 客户端初始化成功")
         except ImportError:
             logger.error("[SemanticAgent] zhipuai 未安装")
@@ -169,6 +249,11 @@ class SemanticAgent:
             skill_count = len(self.skill_manager.list_all())
             logger.info(f"[SemanticAgent] 已加载 {skill_count} 个技能")
             
+            # 技能蒸馏/统计更新在后台单线程执行，不阻塞任务返回
+            self._skill_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="skill-worker"
+            )
+            
         except Exception as e:
             logger.error(f"[SemanticAgent] 技能系统初始化失败: {e}")
             self.skill_manager = None
@@ -185,6 +270,9 @@ class SemanticAgent:
         if not self.skill_manager:
             return None
         
+        # 等待上一个任务的后台技能写入完成，保证检索看到最新技能
+        self._wait_skill_work()
+        
         matches = self.skill_manager.search(
             instruction,
             limit=1,
@@ -202,7 +290,8 @@ class SemanticAgent:
         instruction: str,
         code: str,
         execution_log: list,
-        success: bool
+        success: bool,
+        similarity_checked: bool = False
     ):
         """蒸馏并保存技能
         
@@ -211,6 +300,7 @@ class SemanticAgent:
             code: 执行的代码
             execution_log: 执行日志
             success: 是否成功
+            similarity_checked: 任务开始时的检索已确认不存在相似技能
         """
         if not self.skill_manager:
             return
@@ -220,14 +310,14 @@ class SemanticAgent:
             return
         
         # 检查是否已存在相似技能
-        if not self.skill_manager.should_distill(instruction):
+        if not similarity_checked and not self.skill_manager.should_distill(instruction):
             logger.debug("[SemanticAgent] 已存在相似技能，跳过蒸馏")
             return
         
         try:
             # 创建技能
             skill = Skill(
-                id=f"skill_{hash(instruction) % 100000:05d}",
+                id=_stable_skill_id(instruction),
                 name=self._extract_skill_name(instruction),
                 description=instruction,
                 code=code,
@@ -242,6 +332,33 @@ class SemanticAgent:
         except Exception as e:
             logger.warning(f"[SemanticAgent] 技能蒸馏失败: {e}")
     
+    def _submit_skill_work(self, fn, *args, **kwargs):
+        """提交技能写入任务到后台线程 (无后台线程时同步执行)"""
+        if self._skill_executor is None:
+            fn(*args, **kwargs)
+            return
+        self._pending_skill_work = self._skill_executor.submit(fn, *args, **kwargs)
+    
+    def _wait_skill_work(self):
+        """等待已提交的后台技能任务完成"""
+        pending = self._pending_skill_work
+        if pending is None:
+            return
+        self._pending_skill_work = None
+        try:
+            pending.result()
+        except Exception as e:
+            logger.warning(f"[SemanticAgent] 后台技能任务失败: {e}")
+    
+    def close(self):
+        """关闭代理，等待后台技能任务写入完成"""
+        if self._skill_executor is not None:
+            self._skill_executor.shutdown(wait=True)
+            self._skill_executor = None
+        self._pending_skill_work = None
+        if self.skill_manager:
+            self.skill_manager.shutdown()
+    
     def _extract_skill_name(self, instruction: str) -> str:
         """从指令中提取技能名称"""
         # 简单实现：取前20个字符
@@ -252,42 +369,9 @@ class SemanticAgent:
     
     def _extract_tags(self, instruction: str) -> list:
         """从指令中提取标签"""
-        tags = []
-        
-        # 应用名称识别
-        app_keywords = {
-            "微信": ["微信", "社交"],
-            "支付宝": ["支付宝", "支付"],
-            "淘宝": ["淘宝", "购物"],
-            "抖音": ["抖音", "短视频"],
-            "微博": ["微博", "社交"],
-            "美团": ["美团", "外卖"],
-            "高德": ["高德", "导航"],
-            "地图": ["地图", "导航"],
-        }
-        
-        for keyword, app_tags in app_keywords.items():
-            if keyword in instruction:
-                tags.extend(app_tags)
-                break
-        
-        # 动作识别
-        action_keywords = {
-            "发送": "发送",
-            "点赞": "点赞",
-            "评论": "评论",
-            "搜索": "搜索",
-            "打开": "打开",
-            "返回": "导航",
-        }
-        
-        for keyword, tag in action_keywords.items():
-            if keyword in instruction:
-                tags.append(tag)
-        
-        return list(set(tags))  # 去重
+        return list(_extract_tags_cached(instruction))
     
-    def execute_task(self, user_instruction: str) -> dict:
+    def execute_task(self, user_instruction: str, bypass_cache: bool = False) -> dict:
         """执行用户任务
         
         流程:
@@ -298,6 +382,7 @@ class SemanticAgent:
         
         Args:
             user_instruction: 用户自然语言指令
+            bypass_cache: 是否跳过代码缓存强制重新生成
             
         Returns:
             dict: 执行结果
@@ -308,12 +393,19 @@ class SemanticAgent:
         
         code = None
         skill_used = None
+        similarity_checked = False
         
         # Step 1: 检索已有技能
         if self.enable_skills and self.skill_manager:
             logger.info("\n[Skill] 检索匹配技能...")
             skill_match = self._search_skill(user_instruction)
             
+            # 检索阈值不高于去重阈值时，未命中即说明不存在相似技能，蒸馏时无需再检索一次
+            similarity_checked = (
+                skill_match is None
+                and self.skill_match_threshold <= SkillManager.DUPLICATE_SCORE
+            )
+            
             if skill_match:
                 skill, score = skill_match
                 logger.info(f"[Skill] 找到匹配技能: {skill.name} (分数: {score:.2f})")
@@ -328,9 +420,14 @@ class SemanticAgent:
         # Step 2: 如果没有匹配技能，调用 LLM 生成代码
         if code is None:
             logger.info("\n[LLM] Plan - 生成执行脚本...")
-            code = self._call_llm(user_instruction)
+            # 生成代码期间屏幕不变，并行预取截图供第一步直接使用
+            with ThreadPoolExecutor(max_workers=1) as prefetch_pool:
+                prefetch = prefetch_pool.submit(self.autoglm_driver.prefetch_screen)
+                code = self._call_llm(user_instruction, bypass_cache=bypass_cache)
+                prefetch.result()
             
             if code is None:
+                self.autoglm_driver.discard_prefetch()
                 logger.error("[LLM] 代码生成失败")
                 return {
                     'success': False,
@@ -339,28 +436,45 @@ class SemanticAgent:
                     'skill_used': None
                 }
         
-        logger.info("\n[Code] 执行代码:")
-        logger.info("-" * 60)
-        for i, line in enumerate(code.split('\n'), 1):
-            logger.info(f"  {i:2d} | {line}")
-        logger.info("-" * 60)
+        if logger.isEnabledFor(logging.INFO):
+            listing = "\n".join(
+                f"  {i:2d} | {line}" for i, line in enumerate(code.split('\n'), 1)
+            )
+            separator = "-" * 60
+            logger.info("\n[Code] 执行代码:\n%s\n%s\n%s", separator, listing, separator)
         
         # Step 3: 执行代码
         logger.info("\n[Runtime] Execute - 开始执行...")
-        result = self.runtime.execute(code)
+        try:
+            result = self.runtime.execute(code)
+        finally:
+            # 执行在第一次截图前失败时预取结果未被消费，不能留给后续任务使用
+            self.autoglm_driver.discard_prefetch()
+        
+        # 代码缓存只保留执行成功的代码，失败的代码 (包括缓存命中的) 不再复用
+        if skill_used is None and self.code_cache and self.llm_client:
+            cache_key = self._code_cache_key(user_instruction)
+            if result['success']:
+                self.code_cache.set(cache_key, code)
+            else:
+                self.code_cache.delete(cache_key)
         
         # Step 4: 蒸馏保存技能 (仅对新生成的代码)
         if self.enable_skills and skill_used is None:
-            self._distill_and_save_skill(
+            self._submit_skill_work(
+                self._distill_and_save_skill,
                 instruction=user_instruction,
                 code=code,
                 execution_log=result.get('log', []),
-                success=result['success']
+                success=result['success'],
+                similarity_checked=similarity_checked
             )
         
         # Step 5: 更新技能使用统计 (如果使用了技能)
         if skill_used and self.skill_manager:
-            self.skill_manager.record_usage(skill_used.id, result['success'])
+            self._submit_skill_work(
+                self.skill_manager.record_usage, skill_used.id, result['success']
+            )
         
         # Step 6: 输出结果
         logger.info("\n" + "=" * 80)
@@ -386,11 +500,16 @@ class SemanticAgent:
             'skill_used': skill_used.name if skill_used else None
         }
     
-    def _call_llm(self, user_instruction: str) -> Optional[str]:
+    def _code_cache_key(self, user_instruction: str) -> str:
+        """代码缓存 key (模型 + System Prompt 摘要 + 指令)"""
+        return CodeCache.make_key(self.strategy_model, self._sys_prompt_hash, user_instruction)
+    
+    def _call_llm(self, user_instruction: str, bypass_cache: bool = False) -> Optional[str]:
         """调用 LLM 生成代码
         
         Args:
             user_instruction: 用户指令
+            bypass_cache: 是否跳过缓存强制重新生成
             
         Returns:
             str: Python 代码，或 None（失败）
@@ -399,33 +518,32 @@ class SemanticAgent:
             logger.warning("[LLM] Mock 模式，返回示例代码")
             return f"step('打开应用')\nstep('{user_instruction}')"
         
-        system_prompt = get_strategy_prompt()
+        if self.code_cache and not bypass_cache:
+            code = self.code_cache.get(self._code_cache_key(user_instruction))
+            if code is not None:
+                logger.info("[LLM] 命中代码缓存")
+                return code
+        
         user_prompt = create_user_prompt(user_instruction)
         
         messages = [
-            {"role": "system", "content": system_prompt},
+            self._system_msg,
             {"role": "user", "content": user_prompt}
         ]
         
+        request = {
+            'model': self.strategy_model,
+            'messages': messages,
+            'temperature': 0.3,
+            'max_tokens': 2000,
+        }
+        
         try:
-            response = self.llm_client.chat.completions.create(
-                model=self.strategy_model,
-                messages=messages,
-                temperature=0.3,
-                max_tokens=2000
-            )
-            
-            code = response.choices[0].message.content.strip()
+            response = self.llm_client.chat.completions.create(**request)
             
             # 清理可能的 Markdown 代码块标记
-            if code.startswith('```python'):
-                code = code[len('```python'):].strip()
-            if code.startswith('```'):
-                code = code[3:].strip()
-            if code.endswith('```'):
-                code = code[:-3].strip()
-            
-            return code
+            content = response.choices[0].message.content
+            return _FENCE_RE.match(content).group(1)
             
         except Exception as e:
             logger.error(f"[LLM] API 错误: {e}")
@@ -574,6 +692,8 @@ def main():
             import traceback
             traceback.print_exc()
             continue
+    
+    agent.close()
 
 
 def demo():
@@ -613,6 +733,9 @@ def demo():
         
         input("\n按回车继续...")
     
+    # 等待后台蒸馏写入完成
+    agent._wait_skill_work()
+    
     # 显示蒸馏的技能
     print("\n\n" + "=" * 80)
     print("蒸馏的技能:")
@@ -623,6 +746,8 @@ def demo():
             print(f"\n[{skill.id}] {skill.name}")
             print(f"  描述: {skill.description}")
             print(f"  代码:\n{skill.code}")
+    
+    agent.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+代码缓存 (Code Cache)
+缓存策略层 LLM 生成的代码，重复指令无需再次调用 LLM
+
+存储结构:
+    cache_dir/
+    ├── {key}.json      # {"code": ..., "created_at": ...}
+    └── ...
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class CodeCache:
+    """基于文件系统的代码缓存
+
+    每个条目一个 JSON 文件，超过有效期的条目视为未命中。
+
+    Usage:
+        cache = CodeCache("./.llm_cache")
+        key = CodeCache.make_key("glm-4-flash", prompt_hash, instruction)
+        code = cache.get(key)
+        if code is None:
+            code = call_llm(...)
+        if run(code):
+            cache.set(key, code)     # 只缓存验证可用的代码
+        else:
+            cache.delete(key)
+    """
+
+    def __init__(self, cache_dir: str, ttl: float = 7 * 86400):
+        """初始化
+
+        Args:
+            cache_dir: 缓存目录
+            ttl: 条目有效期（秒）
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """由若干字段生成缓存 key"""
+        return hashlib.blake2b("|".join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存的代码，未命中或已过期返回 None"""
+        path = self._get_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except Exception as e:
+            logger.warning(f"[CodeCache] Failed to load {key}: {e}")
+            return None
+
+        if time.time() - entry.get("created_at", 0) > self.ttl:
+            return None
+        return entry.get("code")
+
+    def set(self, key: str, code: str):
+        """写入缓存"""
+        entry = {"code": code, "created_at": time.time()}
+        path = self._get_path(key)
+        # 每次写入使用独立的临时文件再原子替换，中断或多个进程并发写入都不会留下半截文件
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{key}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"[CodeCache] Failed to save {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def delete(self, key: str):
+        """删除缓存条目（不存在时忽略）"""
+        try:
+            os.remove(self._get_path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"[CodeCache] Failed to delete {key}: {e}")
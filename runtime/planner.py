@@ -12,15 +12,161 @@
 """
 
 import re
+import sys
+import asyncio
 import logging
-from typing import Optional, Callable
+import contextlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Callable, Tuple, Dict, Any
 from dataclasses import dataclass
 
+try:
+    from runtime.code_cache import CodeCache
+except ImportError:
+    from code_cache import CodeCache
+
 
 logger = logging.getLogger(__name__)
 
+# Python 3.10+ 的 dataclass 支持 slots，实例不再携带 __dict__
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+# 代码块匹配模式（模块加载时编译一次）
+_PY_BLOCK = re.compile(r'```python\s*\n(.*?)```', re.DOTALL)
+_ANY_BLOCK = re.compile(r'```\s*\n(.*?)```', re.DOTALL)
+# 无代码块时，代码从第一个含 step( 或以 for/if 开头的行开始
+_CODE_START = re.compile(r'^[^\S\n]*(?:for |if )|^[^\n]*step\(', re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=2)
+def _cached_system_prompt(lite: bool) -> str:
+    """获取系统 Prompt (每种版本只解析一次，返回同一字符串对象)"""
+    try:
+        from runtime.prompts import get_system_prompt
+    except ImportError:
+        from prompts import get_system_prompt
+    return get_system_prompt(lite=lite)
+
+
+
+# 按 (提供商, API Key) 共享同步客户端，多个 Planner 复用同一连接池
+_CLIENTS: Dict[Tuple[str, Optional[str]], Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _get_or_create_client(provider: str, api_key: Optional[str]) -> Any:
+    """获取共享的同步 LLM 客户端，SDK 未安装时返回 None"""
+    key = (provider, api_key)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _create_client(provider, api_key, is_async=False)
+            if client is not None:
+                _CLIENTS[key] = client
+        return client
+
 
-@dataclass
+def _create_client(provider: str, api_key: Optional[str], is_async: bool) -> Any:
+    """创建 LLM 客户端 (在此处才导入 SDK)"""
+    if provider == 'zhipu':
+        if is_async:
+            return None
+        try:
+            from zhipuai import ZhipuAI
+            return ZhipuAI(api_key=api_key)
+        except ImportError:
+            logger.warning("zhipuai not installed")
+            
+    elif provider == 'openai':
+        try:
+            from openai import OpenAI, AsyncOpenAI
+            return AsyncOpenAI(api_key=api_key) if is_async else OpenAI(api_key=api_key)
+        except ImportError:
+            logger.warning("openai not installed")
+            
+    elif provider == 'anthropic':
+        try:
+            import anthropic
+            return anthropic.AsyncAnthropic(api_key=api_key) if is_async else anthropic.Anthropic(api_key=api_key)
+        except ImportError:
+            logger.warning("anthropic not installed")
+    
+    return None
+
+class _FenceCollector:
+    """流式响应累积器
+    
+    记录每个 ``` 的位置，代码块闭合时检查它是否就是要提取的代码:
+    ```python 代码块，或包含 step( 的无语言标记代码块，闭合后即可停止读取；
+    其他语言的代码块 (如 bash) 继续读取，后面可能还有 python 代码块。
+    """
+    
+    def __init__(self):
+        self._parts = []
+        self._tail = ''
+        self._length = 0       # 已接收文本的总长度
+        self._open = None      # 当前未闭合代码块起始 ``` 的位置
+    
+    def feed(self, delta: Optional[str]) -> bool:
+        """追加一段文本，返回目标代码块是否已闭合"""
+        if not delta:
+            return False
+        self._parts.append(delta)
+        
+        # 带上前一段末尾的字符，避免 ``` 被拆在两个 chunk 之间
+        window = self._tail + delta
+        base = self._length - len(self._tail)
+        self._length += len(delta)
+        
+        done = False
+        pos = 0
+        while True:
+            i = window.find('```', pos)
+            if i < 0:
+                break
+            if self._open is None:
+                self._open = base + i
+            else:
+                done = done or self._is_code_block(self._open, base + i)
+                self._open = None
+            pos = i + 3
+        self._tail = window[max(pos, len(window) - 2):]
+        return done
+    
+    def _is_code_block(self, start: int, end: int) -> bool:
+        """[start, end) 处闭合的代码块是否为要提取的代码"""
+        text = self.text
+        newline = text.find('\n', start + 3, end)
+        if newline < 0:
+            return False
+        lang = text[start + 3:newline].strip()
+        return lang == 'python' or (not lang and 'step(' in text[newline + 1:end])
+    
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+
+def _chat_delta(chunk: Any) -> Optional[str]:
+    """OpenAI 兼容流式 chunk 中的文本"""
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
+
+
+def _anthropic_delta(event: Any) -> Optional[str]:
+    """Anthropic 流式事件中的文本"""
+    if event.type == 'message_start':
+        cached = getattr(event.message.usage, 'cache_read_input_tokens', None)
+        logger.debug(f"[Planner] Prompt cache read tokens: {cached}")
+    elif event.type == 'content_block_delta':
+        return getattr(event.delta, 'text', None)
+    return None
+
+
+@dataclass(**_SLOTS)
 class PlanResult:
     """规划结果"""
     success: bool
@@ -49,7 +195,8 @@ class Planner:
         api_key: Optional[str] = None,
         provider: str = 'zhipu',
         model: Optional[str] = None,
-        lite_prompt: bool = False
+        lite_prompt: bool = False,
+        cache_dir: Optional[str] = None
     ):
         """初始化规划器
         
@@ -58,11 +205,18 @@ class Planner:
             provider: LLM 提供商 (zhipu/openai/anthropic/mock)
             model: 模型名称（可选，使用默认）
             lite_prompt: 是否使用轻量版 Prompt
+            cache_dir: 代码缓存目录 (可选，默认 None 不缓存；mock 模式不缓存)。
+                启用后，通过验证的代码按 (提供商, 模型, System Prompt, 指令)
+                缓存 7 天，相同指令直接返回缓存的计划；计划执行失败时
+                调用 invalidate() 删除对应条目。
         """
         self.provider = provider
         self.api_key = api_key
         self.lite_prompt = lite_prompt
         
+        # 相同指令直接复用之前生成并验证通过的代码
+        self.code_cache = CodeCache(cache_dir) if cache_dir and provider != 'mock' else None
+        
         # 默认模型
         self.model = model or {
             'zhipu': 'glm-4-flash',
@@ -70,34 +224,11 @@ class Planner:
             'anthropic': 'claude-3-5-sonnet-20241022',
             'mock': 'mock',
         }.get(provider, 'glm-4-flash')
-        
-        # 初始化客户端
-        self.client = None
-        if provider != 'mock':
-            self._init_client()
     
-    def _init_client(self):
-        """初始化 LLM 客户端"""
-        if self.provider == 'zhipu':
-            try:
-                from zhipuai import ZhipuAI
-                self.client = ZhipuAI(api_key=self.api_key)
-            except ImportError:
-                logger.warning("zhipuai not installed")
-                
-        elif self.provider == 'openai':
-            try:
-                from openai import OpenAI
-                self.client = OpenAI(api_key=self.api_key)
-            except ImportError:
-                logger.warning("openai not installed")
-                
-        elif self.provider == 'anthropic':
-            try:
-                import anthropic
-                self.client = anthropic.Anthropic(api_key=self.api_key)
-            except ImportError:
-                logger.warning("anthropic not installed")
+    @functools.cached_property
+    def client(self) -> Any:
+        """LLM 客户端 (首次调用时才导入 SDK，同一 API Key 的实例共享)"""
+        return _get_or_create_client(self.provider, self.api_key)
     
     def plan(self, instruction: str, max_retries: int = 1) -> PlanResult:
         """生成执行计划（Python 代码）
@@ -109,13 +240,12 @@ class Planner:
         Returns:
             PlanResult: 规划结果
         """
-        # 导入 prompts
-        try:
-            from runtime.prompts import get_system_prompt, validate_code
-        except ImportError:
-            from prompts import get_system_prompt, validate_code
+        system_prompt = _cached_system_prompt(self.lite_prompt)
         
-        system_prompt = get_system_prompt(lite=self.lite_prompt)
+        cache_key = self._cache_key(system_prompt, instruction)
+        cached = self._load_cached(cache_key)
+        if cached:
+            return cached
         
         attempts = 0
         last_error = None
@@ -124,42 +254,15 @@ class Planner:
             attempts += 1
             logger.info(f"[Planner] Attempt {attempts}/{max_retries + 1}: {instruction[:50]}...")
             
-            try:
-                # 调用 LLM
-                raw_response = self._call_llm(system_prompt, instruction)
-                
-                if not raw_response:
-                    last_error = "Empty response from LLM"
-                    continue
-                
-                logger.info(f"[Planner] Raw response: {raw_response[:200]}...")
-                
-                # 提取代码块
-                code = self._extract_code(raw_response)
-                
-                if not code:
-                    last_error = "No code block found in response"
-                    logger.warning(f"[Planner] {last_error}")
-                    continue
-                
-                # 验证代码
-                is_valid, reason = validate_code(code)
-                if not is_valid:
-                    last_error = f"Code validation failed: {reason}"
-                    logger.warning(f"[Planner] {last_error}")
-                    continue
-                
-                # 成功
+            code, raw_response, last_error = self._attempt(system_prompt, instruction)
+            if code:
+                self._store_cached(cache_key, code)
                 return PlanResult(
                     success=True,
                     code=code,
                     raw_response=raw_response,
                     attempts=attempts
                 )
-                
-            except Exception as e:
-                last_error = str(e)
-                logger.error(f"[Planner] Error: {e}")
         
         return PlanResult(
             success=False,
@@ -167,9 +270,207 @@ class Planner:
             attempts=attempts
         )
     
+    def plan_parallel(self, instruction: str, n_parallel: int = 2) -> PlanResult:
+        """并发生成执行计划，返回第一个通过验证的结果
+        
+        各次尝试互相独立且以网络 I/O 为主，并发发起后总耗时
+        约为单次最慢调用，而不是多次调用之和。
+        
+        Args:
+            instruction: 用户自然语言指令
+            n_parallel: 并发尝试次数
+            
+        Returns:
+            PlanResult: 规划结果
+        """
+        system_prompt = _cached_system_prompt(self.lite_prompt)
+        
+        cache_key = self._cache_key(system_prompt, instruction)
+        cached = self._load_cached(cache_key)
+        if cached:
+            return cached
+        
+        logger.info(f"[Planner] {n_parallel} parallel attempts: {instruction[:50]}...")
+        
+        executor = ThreadPoolExecutor(max_workers=n_parallel, thread_name_prefix="planner")
+        futures = [
+            executor.submit(self._attempt, system_prompt, instruction)
+            for _ in range(n_parallel)
+        ]
+        
+        attempts = 0
+        last_error = None
+        try:
+            for future in as_completed(futures):
+                attempts += 1
+                code, raw_response, last_error = future.result()
+                if code:
+                    self._store_cached(cache_key, code)
+                    return PlanResult(
+                        success=True,
+                        code=code,
+                        raw_response=raw_response,
+                        attempts=attempts
+                    )
+        finally:
+            # 已有结果时不再等待其余请求
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        return PlanResult(
+            success=False,
+            error=last_error,
+            attempts=attempts
+        )
+    
+    async def plan_async(self, instruction: str, n_parallel: int = 2) -> PlanResult:
+        """异步并发生成执行计划，返回第一个通过验证的结果
+        
+        与 plan_parallel 相同，但在事件循环中运行，不占用线程。
+        异步客户端的连接池绑定在当前事件循环上，因此每次调用单独创建
+        并在返回前关闭，同一实例可以在多个 asyncio.run() 中使用。
+        
+        Args:
+            instruction: 用户自然语言指令
+            n_parallel: 并发尝试次数
+            
+        Returns:
+            PlanResult: 规划结果
+        """
+        system_prompt = _cached_system_prompt(self.lite_prompt)
+        
+        cache_key = self._cache_key(system_prompt, instruction)
+        cached = self._load_cached(cache_key)
+        if cached:
+            return cached
+        
+        logger.info(f"[Planner] {n_parallel} async attempts: {instruction[:50]}...")
+        
+        attempts = 0
+        last_error = None
+        async with contextlib.AsyncExitStack() as stack:
+            # zhipuai 没有异步客户端 (返回 None)，此时在线程中执行同步调用
+            aclient = _create_client(self.provider, self.api_key, is_async=True)
+            if aclient is not None:
+                await stack.enter_async_context(aclient)
+            
+            tasks = [
+                asyncio.ensure_future(self._attempt_async(system_prompt, instruction, aclient))
+                for _ in range(n_parallel)
+            ]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    attempts += 1
+                    code, raw_response, last_error = await next_done
+                    if code:
+                        self._store_cached(cache_key, code)
+                        return PlanResult(
+                            success=True,
+                            code=code,
+                            raw_response=raw_response,
+                            attempts=attempts
+                        )
+            finally:
+                # 等未完成的尝试真正退出后再关闭客户端
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        
+        return PlanResult(
+            success=False,
+            error=last_error,
+            attempts=attempts
+        )
+    
+    def invalidate(self, instruction: str):
+        """删除指令对应的缓存计划 (计划执行失败后调用，下次重新生成)"""
+        cache_key = self._cache_key(_cached_system_prompt(self.lite_prompt), instruction)
+        if cache_key:
+            self.code_cache.delete(cache_key)
+    
+    def _cache_key(self, system_prompt: str, instruction: str) -> Optional[str]:
+        """代码缓存 key (模型、System Prompt、指令任一变化即失效)"""
+        if not self.code_cache:
+            return None
+        return CodeCache.make_key(self.provider, self.model, system_prompt, instruction)
+    
+    def _load_cached(self, cache_key: Optional[str]) -> Optional[PlanResult]:
+        """读取缓存的规划结果，未命中返回 None"""
+        if not cache_key:
+            return None
+        code = self.code_cache.get(cache_key)
+        if code is None:
+            return None
+        logger.info("[Planner] Cache hit")
+        return PlanResult(success=True, code=code, attempts=0)
+    
+    def _store_cached(self, cache_key: Optional[str], code: str):
+        """写入代码缓存"""
+        if cache_key:
+            self.code_cache.set(cache_key, code)
+    
+    def _attempt(self, system_prompt: str, instruction: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """单次规划尝试
+        
+        Returns:
+            (代码, 原始响应, 错误信息)，成功时错误信息为 None
+        """
+        try:
+            raw_response = self._call_llm(system_prompt, instruction)
+            return self._check_response(raw_response)
+        except Exception as e:
+            logger.error(f"[Planner] Error: {e}")
+            return None, None, str(e)
+    
+    async def _attempt_async(self, system_prompt: str, instruction: str, aclient: Any = None) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """单次规划尝试（异步）"""
+        try:
+            raw_response = await self._call_llm_async(system_prompt, instruction, aclient)
+            return self._check_response(raw_response)
+        except Exception as e:
+            logger.error(f"[Planner] Error: {e}")
+            return None, None, str(e)
+    
+    def _check_response(self, raw_response: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """从 LLM 响应中提取并验证代码
+        
+        Returns:
+            (代码, 原始响应, 错误信息)，成功时错误信息为 None
+        """
+        # 导入 prompts
+        try:
+            from runtime.prompts import validate_code
+        except ImportError:
+            from prompts import validate_code
+        
+        if not raw_response:
+            return None, None, "Empty response from LLM"
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"[Planner] Raw response: {raw_response[:200]}...")
+        
+        # 提取代码块
+        code = self._extract_code(raw_response)
+        
+        if not code:
+            last_error = "No code block found in response"
+            logger.warning(f"[Planner] {last_error}")
+            return None, raw_response, last_error
+        
+        # 验证代码
+        is_valid, reason = validate_code(code)
+        if not is_valid:
+            last_error = f"Code validation failed: {reason}"
+            logger.warning(f"[Planner] {last_error}")
+            return None, raw_response, last_error
+        
+        # 成功
+        return code, raw_response, None
+    
     def _call_llm(self, system_prompt: str, user_message: str) -> Optional[str]:
         """调用 LLM API
         
+        以流式方式读取响应，代码块闭合后立即停止，不等待模型输出后续说明文字。
+        
         Args:
             system_prompt: 系统提示
             user_message: 用户消息
@@ -183,39 +484,89 @@ class Planner:
         if not self.client:
             raise RuntimeError(f"LLM client not initialized for provider: {self.provider}")
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
-        ]
+        request = self._build_request(system_prompt, user_message)
+        collector = _FenceCollector()
         
-        if self.provider == 'zhipu':
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=2000
-            )
-            return response.choices[0].message.content
-            
-        elif self.provider == 'openai':
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=2000
-            )
-            return response.choices[0].message.content
-            
+        if self.provider in ('zhipu', 'openai'):
+            stream = self.client.chat.completions.create(stream=True, **request)
+            try:
+                for chunk in stream:
+                    if collector.feed(_chat_delta(chunk)):
+                        break
+            finally:
+                close = getattr(stream, 'close', None)
+                if close:
+                    close()
+                    
+        elif self.provider == 'anthropic':
+            with self.client.messages.stream(**request) as stream:
+                for event in stream:
+                    if collector.feed(_anthropic_delta(event)):
+                        break
+        else:
+            return None
+        
+        return collector.text
+    
+    async def _call_llm_async(self, system_prompt: str, user_message: str, aclient: Any = None) -> Optional[str]:
+        """调用 LLM API（异步）
+        
+        OpenAI / Anthropic 使用调用方传入的异步客户端；没有异步客户端时
+        (如 zhipuai)，在线程中执行同步调用。
+        """
+        if self.provider == 'mock':
+            return self._mock_response(user_message)
+        
+        if not aclient:
+            return await asyncio.to_thread(self._call_llm, system_prompt, user_message)
+        
+        request = self._build_request(system_prompt, user_message)
+        collector = _FenceCollector()
+        
+        if self.provider == 'openai':
+            stream = await aclient.chat.completions.create(stream=True, **request)
+            try:
+                async for chunk in stream:
+                    if collector.feed(_chat_delta(chunk)):
+                        break
+            finally:
+                await stream.close()
+                
         elif self.provider == 'anthropic':
-            response = self.client.messages.create(
-                model=self.model,
-                system=system_prompt,
-                messages=[{"role": "user", "content": user_message}],
-                max_tokens=2000
-            )
-            return response.content[0].text
+            async with aclient.messages.stream(**request) as stream:
+                async for event in stream:
+                    if collector.feed(_anthropic_delta(event)):
+                        break
+        else:
+            return None
         
-        return None
+        return collector.text
+    
+    def _build_request(self, system_prompt: str, user_message: str) -> Dict[str, Any]:
+        """构造请求参数"""
+        if self.provider == 'anthropic':
+            # 标记 System Prompt 为可缓存前缀，后续调用直接命中缓存
+            return {
+                "model": self.model,
+                "system": [{
+                    "type": "text",
+                    "text": system_prompt,
+                    "cache_control": {"type": "ephemeral"}
+                }],
+                "messages": [{"role": "user", "content": user_message}],
+                "max_tokens": 2000,
+            }
+        
+        # System Prompt 固定在首位且内容不变，服务端可自动缓存该前缀
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 2000,
+        }
     
     def _extract_code(self, text: str) -> Optional[str]:
         """从响应中提取 Python 代码块
@@ -231,36 +582,39 @@ class Planner:
         
         或直接识别 step() 调用
         """
+        # 快速路径: 直接定位 ```python 围栏，无需进入正则引擎
+        start = text.find("```python")
+        if start >= 0:
+            newline = text.find("\n", start + 9)
+            if newline >= 0 and not text[start + 9:newline].strip():
+                end = text.find("```", newline + 1)
+                if end >= 0:
+                    return text[newline + 1:end].strip()
+        
         # 尝试匹配 ```python ... ```
-        python_match = re.search(r'```python\s*\n(.*?)```', text, re.DOTALL)
+        python_match = _PY_BLOCK.search(text)
         if python_match:
             return python_match.group(1).strip()
         
         # 尝试匹配 ``` ... ```
-        code_match = re.search(r'```\s*\n(.*?)```', text, re.DOTALL)
+        code_match = _ANY_BLOCK.search(text)
         if code_match:
             code = code_match.group(1).strip()
             # 检查是否包含 step()
             if 'step(' in code:
                 return code
         
-        # 尝试直接查找 step() 调用
-        lines = text.split('\n')
-        code_lines = []
-        in_code = False
-        
-        for line in lines:
-            stripped = line.strip()
-            if 'step(' in stripped or stripped.startswith('for ') or stripped.startswith('if '):
-                in_code = True
-            if in_code:
-                if stripped and not stripped.startswith('#'):
-                    code_lines.append(line)
-                elif not stripped and code_lines:
-                    # 空行且已有代码，可能是代码结束
-                    pass
-        
-        if code_lines:
+        # 尝试直接查找 step() 调用: 没有 step( 时不可能提取出代码
+        if 'step(' not in text:
+            return None
+        
+        # 用正则定位第一行代码，跳过前面的说明文字
+        start_match = _CODE_START.search(text)
+        if start_match:
+            code_lines = [
+                line for line in text[start_match.start():].split('\n')
+                if line.strip() and not line.strip().startswith('#')
+            ]
             code = '\n'.join(code_lines)
             if 'step(' in code:
                 return code
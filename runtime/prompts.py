@@ -10,6 +10,9 @@ Prompt 工程 (Prompts)
 - 唯一可用的工具函数是 step(goal="语义描述")
 """
 
+import re
+
+
 # ========== 系统 Prompt ==========
 
 SYSTEM_PROMPT = '''你是一个"手机操作流程编排者"。
@@ -165,6 +168,34 @@ def get_system_prompt(lite: bool = False) -> str:
     return SYSTEM_PROMPT_LITE if lite else SYSTEM_PROMPT
 
 
+# 坐标模式
+_COORD_PATTERNS = (
+    r'\b\d{2,4}\s*,\s*\d{2,4}\b',  # 100, 200
+    r'x\s*=\s*\d+',  # x=100
+    r'y\s*=\s*\d+',  # y=200
+    r'0\.\d+\s*,\s*0\.\d+',  # 0.5, 0.3 (归一化坐标也不允许)
+)
+
+# 颜色模式
+_COLOR_PATTERNS = (
+    r'#[0-9A-Fa-f]{6}',  # #FF0000
+    r'rgb\s*\(',  # rgb(
+    r'颜色|color',
+)
+
+# 每类模式合并为一个正则，一次扫描即可判断是否命中 (有效代码只需扫描两次)
+_COORD_RE = re.compile('|'.join(f'(?:{p})' for p in _COORD_PATTERNS))
+_COLOR_RE = re.compile('|'.join(f'(?:{p})' for p in _COLOR_PATTERNS), re.IGNORECASE)
+
+
+def _first_pattern(patterns: tuple, code: str, flags: int = 0) -> str:
+    """按列表顺序返回第一个命中的模式，保持报错信息与逐条检查时一致"""
+    for pattern in patterns:
+        if re.search(pattern, code, flags):
+            return pattern
+    return patterns[0]
+
+
 def validate_code(code: str) -> tuple[bool, str]:
     """简单验证代码是否符合规范
     
@@ -174,30 +205,15 @@ def validate_code(code: str) -> tuple[bool, str]:
     Returns:
         (是否有效, 原因)
     """
-    import re
-    
     # 检查是否有坐标模式
-    coord_patterns = [
-        r'\b\d{2,4}\s*,\s*\d{2,4}\b',  # 100, 200
-        r'x\s*=\s*\d+',  # x=100
-        r'y\s*=\s*\d+',  # y=200
-        r'0\.\d+\s*,\s*0\.\d+',  # 0.5, 0.3 (归一化坐标也不允许)
-    ]
-    
-    for pattern in coord_patterns:
-        if re.search(pattern, code):
-            return False, f"代码中包含坐标值（匹配: {pattern}）"
+    if _COORD_RE.search(code):
+        pattern = _first_pattern(_COORD_PATTERNS, code)
+        return False, f"代码中包含坐标值（匹配: {pattern}）"
     
     # 检查是否有颜色值
-    color_patterns = [
-        r'#[0-9A-Fa-f]{6}',  # #FF0000
-        r'rgb\s*\(',  # rgb(
-        r'颜色|color',
-    ]
-    
-    for pattern in color_patterns:
-        if re.search(pattern, code, re.IGNORECASE):
-            return False, f"代码中包含颜色值（匹配: {pattern}）"
+    if _COLOR_RE.search(code):
+        pattern = _first_pattern(_COLOR_PATTERNS, code, re.IGNORECASE)
+        return False, f"代码中包含颜色值（匹配: {pattern}）"
     
     # 检查是否使用了 step()
     if 'step(' not in code:
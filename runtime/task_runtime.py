@@ -13,7 +13,8 @@
 
 import sys
 import logging
-import traceback
+import functools
+from types import CodeType
 from typing import Optional, Callable, Dict, Any, List
 from dataclasses import dataclass, field
 from io import StringIO
@@ -21,8 +22,17 @@ from io import StringIO
 
 logger = logging.getLogger(__name__)
 
+# 每步都会创建 ExecutionLog，3.10+ 上使用 slots 节省内存
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@functools.lru_cache(maxsize=128)
+def _compile_cached(code: str) -> CodeType:
+    """编译运行时代码 (按源码缓存，重复代码跳过解析和编译)"""
+    return compile(code, '<runtime>', 'exec')
+
+
+@dataclass(**_SLOTS)
 class ExecutionLog:
     """执行日志条目"""
     step_num: int
@@ -31,7 +41,7 @@ class ExecutionLog:
     error: Optional[str] = None
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class RuntimeResult:
     """运行时执行结果"""
     success: bool
@@ -51,6 +61,9 @@ class TaskRuntime:
     3. 屏蔽危险操作（文件、网络、系统调用等）
     4. 记录每一步的执行日志
     
+    相邻的 step() 调用不会合并成批量请求: 每一步都要基于上一步操作后的
+    新截图做视觉定位，提前下发后续目标只会让它们作用在过时的界面上。
+    
     Usage:
         runtime = TaskRuntime(driver, vision, capture_func)
         result = runtime.execute('''
@@ -78,8 +91,59 @@ class TaskRuntime:
         
         # 执行状态
         self.step_count = 0
-        self.logs: List[ExecutionLog] = []
         self._stop_requested = False
+        
+        # 执行日志按列存储，需要时再组装成 ExecutionLog
+        self._step_nums: List[int] = []
+        self._goals: List[str] = []
+        self._successes = bytearray()
+        self._errors: List[Optional[str]] = []
+        
+        # print 输出缓冲区，每次执行前清空复用
+        self._stdout_buf = StringIO()
+        self._safe_print = functools.partial(print, file=self._stdout_buf)
+        
+        # 允许的内置函数（只构建一次，每次执行复制一份）
+        self._safe_builtins_template = {
+            # 基础
+            'print': print,
+            'len': len,
+            'range': range,
+            'enumerate': enumerate,
+            'zip': zip,
+            'map': map,
+            'filter': filter,
+            'sorted': sorted,
+            'reversed': reversed,
+            'list': list,
+            'dict': dict,
+            'set': set,
+            'tuple': tuple,
+            'str': str,
+            'int': int,
+            'float': float,
+            'bool': bool,
+            'abs': abs,
+            'min': min,
+            'max': max,
+            'sum': sum,
+            'any': any,
+            'all': all,
+            'isinstance': isinstance,
+            'type': type,
+            # 字符串操作
+            'format': format,
+            'repr': repr,
+            # 异常
+            'Exception': Exception,
+            'ValueError': ValueError,
+            'TypeError': TypeError,
+            'RuntimeError': RuntimeError,
+            # 特殊值
+            'True': True,
+            'False': False,
+            'None': None,
+        }
     
     def _create_step_wrapper(self) -> Callable[[str], bool]:
         """创建带计数和日志的 step 包装函数"""
@@ -106,83 +170,58 @@ class TaskRuntime:
                 logger.error(f"[Runtime] Max steps ({self.max_steps}) exceeded")
                 raise RuntimeError(f"Maximum steps ({self.max_steps}) exceeded")
             
-            logger.info(f"[Runtime] Step {self.step_count}: {goal}")
+            logger.info("[Runtime] Step %d: %s", self.step_count, goal)
             
             try:
                 # 调用实际的 step 函数
                 success = self.step_function(goal)
                 
                 # 记录日志
-                self.logs.append(ExecutionLog(
-                    step_num=self.step_count,
-                    goal=goal,
-                    success=success
-                ))
+                self._append_log(goal, success)
                 
                 return success
                 
             except Exception as e:
                 # 记录失败
-                self.logs.append(ExecutionLog(
-                    step_num=self.step_count,
-                    goal=goal,
-                    success=False,
-                    error=str(e)
-                ))
+                self._append_log(goal, False, str(e))
                 logger.error(f"[Runtime] Step failed: {e}")
                 raise
         
         return step
     
+    def _append_log(self, goal: str, success: bool, error: Optional[str] = None):
+        """追加一条执行日志"""
+        self._step_nums.append(self.step_count)
+        self._goals.append(goal)
+        self._successes.append(1 if success else 0)
+        self._errors.append(error)
+    
+    def _reset_logs(self):
+        """清空执行日志"""
+        self._step_nums.clear()
+        self._goals.clear()
+        self._successes.clear()
+        self._errors.clear()
+    
+    @property
+    def logs(self) -> List[ExecutionLog]:
+        """执行日志"""
+        return [
+            ExecutionLog(step_num=n, goal=g, success=bool(ok), error=err)
+            for n, g, ok, err in zip(self._step_nums, self._goals, self._successes, self._errors)
+        ]
+    
+    def _failed_count(self) -> int:
+        """失败步数"""
+        return len(self._successes) - sum(self._successes)
+    
     def _create_safe_globals(self) -> Dict[str, Any]:
         """创建安全的全局命名空间
         
         只允许基本的 Python 内置函数，屏蔽危险操作。
         """
-        # 允许的内置函数
-        safe_builtins = {
-            # 基础
-            'print': print,
-            'len': len,
-            'range': range,
-            'enumerate': enumerate,
-            'zip': zip,
-            'map': map,
-            'filter': filter,
-            'sorted': sorted,
-            'reversed': reversed,
-            'list': list,
-            'dict': dict,
-            'set': set,
-            'tuple': tuple,
-            'str': str,
-            'int': int,
-            'float': float,
-            'bool': bool,
-            'abs': abs,
-            'min': min,
-            'max': max,
-            'sum': sum,
-            'any': any,
-            'all': all,
-            'isinstance': isinstance,
-            'type': type,
-            # 字符串操作
-            'format': format,
-            'repr': repr,
-            # 异常
-            'Exception': Exception,
-            'ValueError': ValueError,
-            'TypeError': TypeError,
-            'RuntimeError': RuntimeError,
-            # 特殊值
-            'True': True,
-            'False': False,
-            'None': None,
-        }
-        
         return {
-            '__builtins__': safe_builtins,
+            '__builtins__': self._safe_builtins_template.copy(),
             '__name__': '__runtime__',
             '__doc__': None,
         }
@@ -208,7 +247,7 @@ class TaskRuntime:
         """
         # 重置状态
         self.step_count = 0
-        self.logs = []
+        self._reset_logs()
         self._stop_requested = False
         
         # 创建 step 包装函数
@@ -219,21 +258,24 @@ class TaskRuntime:
         safe_locals = self._create_safe_locals(step_wrapper)
         
         # 捕获 print 输出
-        output_buffer = StringIO()
-        safe_globals['__builtins__']['print'] = lambda *args, **kwargs: print(*args, **kwargs, file=output_buffer)
+        self._stdout_buf.seek(0)
+        self._stdout_buf.truncate(0)
+        safe_globals['__builtins__']['print'] = self._safe_print
         
         logger.info(f"[Runtime] Executing code:\n{code}")
         
         try:
             # 编译代码（提前检查语法错误）
-            compiled = compile(code, '<runtime>', 'exec')
+            compiled = _compile_cached(code)
             
-            # 执行
-            exec(compiled, safe_globals, safe_locals)
+            # 执行 (合并为单一命名空间，名字查找走全局快速路径，
+            # 代码中定义的函数也能访问顶层变量)
+            safe_globals.update(safe_locals)
+            exec(compiled, safe_globals)
             
             # 成功
-            output = output_buffer.getvalue()
-            failed = sum(1 for log in self.logs if not log.success)
+            output = self._stdout_buf.getvalue()
+            failed = self._failed_count()
             
             return RuntimeResult(
                 success=True,
@@ -253,14 +295,13 @@ class TaskRuntime:
             )
             
         except Exception as e:
-            logger.error(f"[Runtime] Execution error: {e}")
-            logger.error(traceback.format_exc())
+            logger.error(f"[Runtime] Execution error: {e}", exc_info=True)
             return RuntimeResult(
                 success=False,
                 logs=self.logs,
                 error=str(e),
                 total_steps=self.step_count,
-                failed_steps=sum(1 for log in self.logs if not log.success)
+                failed_steps=self._failed_count()
             )
     
     def stop(self):
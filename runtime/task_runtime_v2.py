@@ -21,8 +21,9 @@ Long-horizon Planning 支持:
 import os
 import sys
 import logging
-from typing import Optional, Dict, Any, Callable
-from io import StringIO
+import functools
+from types import CodeType
+from typing import Optional, Dict, Any, Callable, Union, Tuple, List
 
 # 添加项目路径
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -37,6 +38,57 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# 缓存容量按本地技能库规模估算，保证常用技能的代码对象都能常驻
+@functools.lru_cache(maxsize=256)
+def compile_task_code(code: str) -> CodeType:
+    """编译任务代码 (按源码缓存，技能复用时跳过重复解析和编译)"""
+    return compile(code, '<task>', 'exec')
+
+
+_RULE = "=" * 60
+
+
+def _log_banner(level: int, message: str, body: Optional[str] = None, exc_info: bool = False):
+    """输出带分隔线的日志块
+    
+    整块合并为一条日志记录，只经过一次 handler 和一次写入，
+    也不会被其他线程的日志插到中间。
+    """
+    if not logger.isEnabledFor(level):
+        return
+    text = f"{_RULE}\n{message}\n{_RULE}"
+    if body:
+        text = f"{text}\n{body}"
+    logger.log(level, text, exc_info=exc_info)
+
+
+def _format_log_entry(entry: Tuple) -> str:
+    """把 (kind, *args) 形式的日志条目格式化为调用文本"""
+    kind = entry[0]
+    if kind == 'step':
+        _, goal, expect = entry
+        if expect:
+            return f"step('{goal}', expect='{expect}')"
+        return f"step('{goal}')"
+    return f"{kind}('{entry[1]}')"
+
+
+class _OutputBuffer:
+    """print 输出缓冲区 - 写入时只追加到列表，读取时一次性 join"""
+    
+    __slots__ = ('_parts', 'write')
+    
+    def __init__(self):
+        self._parts = []
+        self.write = self._parts.append
+    
+    def flush(self):
+        pass
+    
+    def getvalue(self) -> str:
+        return ''.join(self._parts)
+
+
 class TaskRuntime:
     """任务运行时 - 代码执行沙盒
     
@@ -47,7 +99,11 @@ class TaskRuntime:
     4. 提供 checkpoint(description) 验证检查点
     5. 处理异常 (SafetyError/MaxRetryError)
     6. 捕获执行日志
-    
+
+    注意: step()/ask()/checkpoint() 严格按代码顺序串行执行。
+    所有调用共享同一块物理屏幕，前一步产生的界面状态就是后一步的前提，
+    即使两次调用之间没有变量依赖，也不能并发调度。
+
     Example:
         driver = AutoGLMDriver(api_key, hardware_driver)
         runtime = TaskRuntime(driver)
@@ -81,16 +137,38 @@ class TaskRuntime:
         self.is_running = False
         self.last_error: Optional[Exception] = None
         
-        # 日志捕获
-        self.execution_log = []
+        # 日志捕获 (按 (kind, *args) 元组记录，读取时再格式化)
+        self._log_entries: List[Tuple] = []
+        
+        # 基础执行环境只构建一次，每次执行复制一份
+        self._base_env = {
+            # 核心语义接口
+            'step': self._step,
+            'ask': self._ask,
+            'checkpoint': self._checkpoint,
+            
+            # 允许基本的 Python 内置函数
+            'range': range,
+            'len': len,
+            'print': print,
+            'str': str,
+            'int': int,
+            'float': float,
+            'bool': bool,
+            'list': list,
+            'dict': dict,
+            'True': True,
+            'False': False,
+            'None': None,
+        }
         
         logger.info("[TaskRuntime] 初始化完成")
     
-    def execute(self, code: str) -> Dict[str, Any]:
+    def execute(self, code: Union[str, CodeType]) -> Dict[str, Any]:
         """执行 LLM 生成的代码
         
         Args:
-            code: Python 代码字符串
+            code: Python 代码字符串，或已编译的代码对象
             
         Returns:
             Dict: 执行结果
@@ -102,204 +180,157 @@ class TaskRuntime:
                 'log': List[str]
             }
         """
-        logger.info("=" * 60)
-        logger.info("[TaskRuntime] 开始执行代码")
-        logger.info("=" * 60)
-        logger.info(f"代码:\n{code}")
-        logger.info("-" * 60)
+        if isinstance(code, str):
+            _log_banner(logging.INFO, "[TaskRuntime] 开始执行代码", f"代码:\n{code}\n{'-' * 60}")
+        else:
+            _log_banner(logging.INFO, "[TaskRuntime] 开始执行代码", "-" * 60)
         
         self.is_running = True
         self.last_error = None
-        self.execution_log = []
+        self._log_entries = []
         
         try:
-            # 准备执行环境
-            local_env = self._prepare_environment()
-            
-            # 捕获 stdout
-            old_stdout = sys.stdout
-            sys.stdout = StringIO()
+            # 准备执行环境 (print 写入本次执行独立的缓冲区，不修改全局 sys.stdout)
+            local_env, output_buffer = self._prepare_environment()
             
             try:
                 # 执行代码
-                exec(code, {}, local_env)
+                if isinstance(code, str):
+                    code = compile_task_code(code)
+                exec(code, local_env)
                 
                 # 成功
-                logger.info("=" * 60)
-                logger.info("[TaskRuntime] 执行完成")
-                logger.info("=" * 60)
-                
-                stats = self.autoglm_driver.get_stats()
+                _log_banner(logging.INFO, "[TaskRuntime] 执行完成")
                 
-                return {
-                    'success': True,
-                    'error': None,
-                    'steps': stats['total_steps'],
-                    'retries': stats['total_retries'],
-                    'log': self.execution_log
-                }
+                return self._make_result(True)
                 
             finally:
-                # 恢复 stdout
-                captured_output = sys.stdout.getvalue()
-                sys.stdout = old_stdout
+                captured_output = output_buffer.getvalue()
                 if captured_output:
                     logger.debug(f"捕获的输出:\n{captured_output}")
         
         except SafetyError as e:
-            logger.error("=" * 60)
-            logger.error(f"[TaskRuntime] 安全检查失败: {e}")
-            logger.error("=" * 60)
+            _log_banner(logging.ERROR, f"[TaskRuntime] 安全检查失败: {e}")
             self.last_error = e
             
-            return {
-                'success': False,
-                'error': f'SafetyError: {e}',
-                'steps': self.autoglm_driver.get_stats()['total_steps'],
-                'retries': self.autoglm_driver.get_stats()['total_retries'],
-                'log': self.execution_log
-            }
+            return self._make_result(False, f'SafetyError: {e}')
         
         except MaxRetryError as e:
-            logger.error("=" * 60)
-            logger.error(f"[TaskRuntime] 达到最大重试次数: {e}")
-            logger.error("=" * 60)
+            _log_banner(logging.ERROR, f"[TaskRuntime] 达到最大重试次数: {e}")
             self.last_error = e
             
-            return {
-                'success': False,
-                'error': f'MaxRetryError: {e}',
-                'steps': self.autoglm_driver.get_stats()['total_steps'],
-                'retries': self.autoglm_driver.get_stats()['total_retries'],
-                'log': self.execution_log
-            }
+            return self._make_result(False, f'MaxRetryError: {e}')
         
         except Exception as e:
-            logger.error("=" * 60)
-            logger.error(f"[TaskRuntime] 执行异常: {e}")
-            logger.error("=" * 60)
+            _log_banner(logging.ERROR, f"[TaskRuntime] 执行异常: {e}", exc_info=True)
             self.last_error = e
             
-            import traceback
-            traceback.print_exc()
-            
-            return {
-                'success': False,
-                'error': f'ExecutionError: {e}',
-                'steps': self.autoglm_driver.get_stats()['total_steps'],
-                'retries': self.autoglm_driver.get_stats()['total_retries'],
-                'log': self.execution_log
-            }
+            return self._make_result(False, f'ExecutionError: {e}')
         
         finally:
             self.is_running = False
     
-    def _prepare_environment(self) -> Dict[str, Any]:
+    @property
+    def execution_log(self) -> List[str]:
+        """执行日志 (格式化后的调用文本)"""
+        return [_format_log_entry(entry) for entry in self._log_entries]
+    
+    def _make_result(self, success: bool, error: Optional[str] = None) -> Dict[str, Any]:
+        """构造执行结果"""
+        stats = self.autoglm_driver.get_stats()
+        return {
+            'success': success,
+            'error': error,
+            'steps': stats['total_steps'],
+            'retries': stats['total_retries'],
+            'log': self.execution_log
+        }
+    
+    def _prepare_environment(self) -> Tuple[Dict[str, Any], _OutputBuffer]:
         """准备执行环境 - 只注入必要的函数
         
+        复制 __init__ 中构建好的基础环境，只替换绑定到本次输出缓冲区的 print。
+        
         Returns:
-            Dict: locals 字典
+            Tuple: (locals 字典, print 输出缓冲区)
         """
+        output_buffer = _OutputBuffer()
+        local_env = self._base_env.copy()
+        local_env['print'] = functools.partial(print, file=output_buffer)
+        return local_env, output_buffer
+    
+    def _step(self, goal: str, expect: str = None) -> StepResult:
+        """语义操作接口 - 透传给 AutoGLMDriver
         
-        def step(goal: str, expect: str = None) -> StepResult:
-            """语义操作接口 - 透传给 AutoGLMDriver
-            
-            Args:
-                goal: 语义目标描述 (如 "点击搜索框")
-                expect: 期望结果描述 (可选, 如 "显示搜索页面")
-                
-            Returns:
-                StepResult: 包含 success, state, has_more 属性
-                
-            Raises:
-                SafetyError: 安全检查失败
-                MaxRetryError: 达到最大重试次数
-                
-            Example:
-                result = step('点击确定按钮', expect='返回主页面')
-                if result.success:
-                    print(f'当前状态: {result.state}')
-            """
-            log_msg = f"step('{goal}'"
-            if expect:
-                log_msg += f", expect='{expect}'"
-            log_msg += ")"
-            
-            logger.info(f"[TaskRuntime] -> {log_msg}")
-            self.execution_log.append(log_msg)
-            
-            result = self.autoglm_driver.execute_step(goal, expect)
-            
-            logger.info(f"[TaskRuntime] <- {result}")
-            return result
+        Args:
+            goal: 语义目标描述 (如 "点击搜索框")
+            expect: 期望结果描述 (可选, 如 "显示搜索页面")
         
-        def ask(question: str) -> str:
-            """查询当前界面状态
-            
-            Args:
-                question: 问题 (如 "当前页面是什么?")
-                
-            Returns:
-                str: AutoGLM 对当前界面的回答
-                
-            Example:
-                answer = ask('屏幕上显示多少张照片?')
-                if '0' in answer:
-                    print('没有照片了')
-            """
-            logger.info(f"[TaskRuntime] -> ask('{question}')")
-            self.execution_log.append(f"ask('{question}')")
-            
-            answer = self.autoglm_driver.ask(question)
-            
-            logger.info(f"[TaskRuntime] <- '{answer}'")
-            return answer
+        Returns:
+            StepResult: 包含 success, state, has_more 属性
         
-        def checkpoint(description: str) -> bool:
-            """验证检查点 - 支持循环终止判断
-            
-            Args:
-                description: 期望状态描述 (如 "还有照片需要删除")
-                
-            Returns:
-                bool: 当前界面是否符合描述
-                
-            Example:
-                # 循环删除直到没有照片
-                while checkpoint('还有照片需要删除'):
-                    step('删除第一张照片')
-            """
-            logger.info(f"[TaskRuntime] -> checkpoint('{description}')")
-            self.execution_log.append(f"checkpoint('{description}')")
-            
-            result = self.autoglm_driver.checkpoint(description)
-            
-            logger.info(f"[TaskRuntime] <- {result}")
-            return result
+        Raises:
+            SafetyError: 安全检查失败
+            MaxRetryError: 达到最大重试次数
         
-        # 注入语义控制函数
-        local_env = {
-            # 核心语义接口
-            'step': step,
-            'ask': ask,
-            'checkpoint': checkpoint,
-            
-            # 允许基本的 Python 内置函数
-            'range': range,
-            'len': len,
-            'print': print,
-            'str': str,
-            'int': int,
-            'float': float,
-            'bool': bool,
-            'list': list,
-            'dict': dict,
-            'True': True,
-            'False': False,
-            'None': None,
-        }
+        Example:
+            result = step('点击确定按钮', expect='返回主页面')
+            if result.success:
+                print(f'当前状态: {result.state}')
+        """
+        entry = ('step', goal, expect)
+        self._log_entries.append(entry)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("[TaskRuntime] -> %s", _format_log_entry(entry))
+        
+        result = self.autoglm_driver.execute_step(goal, expect)
+        
+        logger.info("[TaskRuntime] <- %s", result)
+        return result
+    
+    def _ask(self, question: str) -> str:
+        """查询当前界面状态
+        
+        Args:
+            question: 问题 (如 "当前页面是什么?")
+        
+        Returns:
+            str: AutoGLM 对当前界面的回答
+        
+        Example:
+            answer = ask('屏幕上显示多少张照片?')
+            if '0' in answer:
+                print('没有照片了')
+        """
+        logger.info("[TaskRuntime] -> ask('%s')", question)
+        self._log_entries.append(('ask', question))
+        
+        answer = self.autoglm_driver.ask(question)
+        
+        logger.info("[TaskRuntime] <- '%s'", answer)
+        return answer
+    
+    def _checkpoint(self, description: str) -> bool:
+        """验证检查点 - 支持循环终止判断
+        
+        Args:
+            description: 期望状态描述 (如 "还有照片需要删除")
+        
+        Returns:
+            bool: 当前界面是否符合描述
+        
+        Example:
+            # 循环删除直到没有照片
+            while checkpoint('还有照片需要删除'):
+                step('删除第一张照片')
+        """
+        logger.info("[TaskRuntime] -> checkpoint('%s')", description)
+        self._log_entries.append(('checkpoint', description))
+        
+        result = self.autoglm_driver.checkpoint(description)
         
-        return local_env
+        logger.info("[TaskRuntime] <- %s", result)
+        return result
     
     def stop(self):
         """停止执行 (用于外部中断)"""
@@ -97,6 +97,8 @@ Skills 模块
 客户端通过 ``RemoteSkillStore`` 访问。
 """
 
+import importlib
+
 # ========== 协议和数据模型 ==========
 from .protocols import (
     # 数据模型
@@ -141,36 +143,36 @@ from .skill_manager import (
 
 # ========== 向后兼容：原有组件 ==========
 # 这些组件保持原有接口，同时可以与新系统集成
+# 首次访问时才导入 (PEP 562)，只用存储/管理器的场景不加载它们的依赖；
+# 导入失败时与之前一样返回 None
+
+_LAZY_COMPONENTS = {
+    "SkillRegistry": ".skill_registry",
+    "SkillDistiller": ".skill_distiller",
+    "SemanticMatcher": ".semantic_matcher",
+    "DeclarativeSkillDefinition": ".declarative_skill",
+    "BidirectionalDistiller": ".bidirectional_distiller",
+    "SkillTranslator": ".skill_translator",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_COMPONENTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    try:
+        module = importlib.import_module(module_name, __name__)
+        value = getattr(module, name)
+    except (ImportError, AttributeError):
+        value = None
+    
+    globals()[name] = value
+    return value
+
 
-try:
-    from .skill_registry import SkillRegistry
-except ImportError:
-    SkillRegistry = None
-
-try:
-    from .skill_distiller import SkillDistiller
-except ImportError:
-    SkillDistiller = None
-
-try:
-    from .semantic_matcher import SemanticMatcher
-except ImportError:
-    SemanticMatcher = None
-
-try:
-    from .declarative_skill import DeclarativeSkillDefinition
-except ImportError:
-    DeclarativeSkillDefinition = None
-
-try:
-    from .bidirectional_distiller import BidirectionalDistiller
-except ImportError:
-    BidirectionalDistiller = None
-
-try:
-    from .skill_translator import SkillTranslator
-except ImportError:
-    SkillTranslator = None
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_COMPONENTS))
 
 
 # ========== 版本信息 ==========
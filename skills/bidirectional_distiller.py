@@ -11,16 +11,32 @@
 """
 
 import re
+import sys
 import logging
 from typing import Optional, List, Dict, Any, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 
+from skills.declarative_skill import (
+    DeclarativeSkill, TriggerCondition, Preference, SkillType
+)
+
 
 logger = logging.getLogger(__name__)
 
+# 代码分析用正则（模块加载时编译一次）
+_LOOP_RE = re.compile(r'for\s+(\w+)\s+in\s+range\((\d+)\)')
+_STEP_RE = re.compile(r'step\(["\'](.+?)["\']\)')
+_NUM_RE = re.compile(r'\d+')
+_NAME_STRIP_RE = re.compile(r'\d+|前|后|第|条|个|次|帮我|给我')
+_RANGE_RE = re.compile(r'range\(\d+\)')
+_LOOPVAR_RE = re.compile(r'\{\s*\w+\s*\+\s*1\s*\}')
+
+# 批量蒸馏历史轨迹时实例很多，3.10+ 上去掉 __dict__
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@dataclass(**_SLOTS)
 class ExecutionTrace:
     """执行轨迹"""
     instruction: str           # 用户原始指令
@@ -87,12 +103,23 @@ class BidirectionalDistiller:
     }
     
     def __init__(self):
-        pass
+        # 所有应用/动作关键词合并为一个正则，一次扫描识别全部类别
+        # 用前瞻匹配，关键词互相重叠时也不会漏掉
+        owners = {}
+        for app, kws in self.APP_KEYWORDS.items():
+            for kw in kws:
+                owners.setdefault(kw, ('app', app))
+        for action, kws in self.ACTION_KEYWORDS.items():
+            for kw in kws:
+                owners.setdefault(kw, ('action', action))
+        alternation = '|'.join(re.escape(kw) for kw in sorted(owners, key=len, reverse=True))
+        self._keyword_re = re.compile(f'(?=({alternation}))')
+        self._keyword_owners = owners
     
     def distill_to_declarative(
         self,
         trace: ExecutionTrace
-    ) -> Optional['DeclarativeSkill']:
+    ) -> Optional[DeclarativeSkill]:
         """从执行轨迹蒸馏为声明式技能
         
         Args:
@@ -105,11 +132,6 @@ class BidirectionalDistiller:
             logger.warning("[Distiller] Cannot distill from failed execution")
             return None
         
-        # 延迟导入避免循环依赖
-        from skills.declarative_skill import (
-            DeclarativeSkill, TriggerCondition, Preference, SkillType
-        )
-        
         # 1. 分析代码结构
         analysis = self._analyze_code(trace.code)
         
@@ -167,42 +189,40 @@ class BidirectionalDistiller:
         }
         
         # 检查循环
-        loop_match = re.search(r'for\s+(\w+)\s+in\s+range\((\d+)\)', code)
+        loop_match = _LOOP_RE.search(code)
         if loop_match:
             analysis['has_loop'] = True
             analysis['loop_var'] = loop_match.group(1)
             analysis['loop_count'] = int(loop_match.group(2))
         
         # 提取步骤
-        step_matches = re.findall(r'step\(["\'](.+?)["\']\)', code)
+        step_matches = _STEP_RE.findall(code)
         analysis['steps'] = step_matches
         
         # 提取数字
-        number_matches = re.findall(r'\d+', code)
+        number_matches = _NUM_RE.findall(code)
         analysis['numbers'] = [int(n) for n in number_matches]
         
-        # 识别应用
-        for app, keywords in self.APP_KEYWORDS.items():
-            for kw in keywords:
-                if kw in code.lower():
-                    analysis['apps'].append(app)
-                    break
-        
-        # 识别动作
-        for action, keywords in self.ACTION_KEYWORDS.items():
-            for kw in keywords:
-                if kw in code.lower():
-                    analysis['actions'].append(action)
-                    break
+        # 识别应用和动作
+        analysis['apps'], analysis['actions'] = self._match_keywords(code.lower())
         
         return analysis
     
+    def _match_keywords(self, text: str) -> Tuple[List[str], List[str]]:
+        """识别文本中出现的应用和动作
+        
+        Returns:
+            (应用列表, 动作列表)，均按关键词表中的顺序排列
+        """
+        found = {self._keyword_owners[m.group(1)] for m in self._keyword_re.finditer(text)}
+        apps = [app for app in self.APP_KEYWORDS if ('app', app) in found]
+        actions = [action for action in self.ACTION_KEYWORDS if ('action', action) in found]
+        return apps, actions
+    
     def _generate_name(self, instruction: str) -> str:
         """生成技能名称"""
         # 移除数字和量词
-        name = re.sub(r'\d+', '', instruction)
-        name = re.sub(r'前|后|第|条|个|次|帮我|给我', '', name)
-        name = name.strip()
+        name = _NAME_STRIP_RE.sub('', instruction).strip()
         
         if len(name) > 15:
             name = name[:15]
@@ -219,46 +239,54 @@ class BidirectionalDistiller:
         analysis: Dict[str, Any]
     ) -> str:
         """生成自然语言行为描述"""
-        parts = []
-        
-        # 目标
-        parts.append(f"目标：{trace.instruction}")
-        parts.append("")
+        # 固定结构用模板，只有可选行和步骤列表需要动态生成
+        app_line = f"\n- {analysis['apps'][0]}已安装" if analysis['apps'] else ""
+        like_line = "\n- 如果已点赞则跳过" if '点赞' in trace.instruction else ""
+        steps_block = "".join(f"{line}\n" for line in self._behavior_steps(analysis))
+        
+        return (
+            f"目标：{trace.instruction}\n"
+            f"\n"
+            f"前置条件：\n"
+            f"- 手机已解锁{app_line}\n"
+            f"\n"
+            f"步骤：\n"
+            f"{steps_block}"
+            f"\n"
+            f"注意事项：\n"
+            f"- 每步操作后验证执行结果{like_line}\n"
+            f"- 遇到异常时暂停并报告"
+        )
+    
+    def _behavior_steps(self, analysis: Dict[str, Any]) -> List[str]:
+        """生成行为描述中的步骤列表
         
-        # 前置条件
-        parts.append("前置条件：")
-        parts.append("- 手机已解锁")
-        if analysis['apps']:
-            parts.append(f"- {analysis['apps'][0]}已安装")
-        parts.append("")
-        
-        # 步骤
-        parts.append("步骤：")
-        step_num = 1
-        
-        for i, step in enumerate(analysis['steps']):
-            # 检查是否在循环中（简化逻辑）
-            if analysis['has_loop'] and '第' in step and '{' in step:
-                if step_num == len(analysis['steps']) - 1:
-                    # 循环步骤的描述
-                    count = analysis['loop_count'] or 3
-                    parts.append(f"{step_num}. 重复以下操作 {count} 次：")
-                    parts.append(f"   a. {step.replace('{i+1}', 'N')}")
-                    step_num += 1
-            else:
-                parts.append(f"{step_num}. {step}")
-                step_num += 1
-        
-        parts.append("")
-        
-        # 注意事项
-        parts.append("注意事项：")
-        parts.append("- 每步操作后验证执行结果")
-        if '点赞' in trace.instruction:
-            parts.append("- 如果已点赞则跳过")
-        parts.append("- 遇到异常时暂停并报告")
-        
-        return "\n".join(parts)
+        普通步骤依次编号；只有编号恰好落在倒数第二位的循环步骤会展开为
+        "重复以下操作"，其余循环步骤不输出（简化逻辑）。
+        """
+        steps = analysis['steps']
+        last_idx = len(steps) - 1
+        is_loop_step = [analysis['has_loop'] and '第' in s and '{' in s for s in steps]
+        plain = [s for s, is_loop in zip(steps, is_loop_step) if not is_loop]
+        
+        # 循环步骤之前必须正好有 last_idx - 1 个普通步骤，只可能位于最后两位
+        n_before = last_idx - 1
+        loop_step = next(
+            (steps[i] for i in (last_idx - 1, last_idx)
+             if i >= 0 and is_loop_step[i] and is_loop_step[:i].count(False) == n_before),
+            None
+        )
+        if loop_step is None:
+            return [f"{n}. {s}" for n, s in enumerate(plain, 1)]
+        
+        # 循环步骤的描述
+        count = analysis['loop_count'] or 3
+        return [
+            *(f"{n}. {s}" for n, s in enumerate(plain[:n_before], 1)),
+            f"{last_idx}. 重复以下操作 {count} 次：",
+            f"   a. {_LOOPVAR_RE.sub('N', loop_step)}",
+            *(f"{n}. {s}" for n, s in enumerate(plain[n_before:], last_idx + 1)),
+        ]
     
     def _extract_parameters(
         self,
@@ -286,25 +314,19 @@ class BidirectionalDistiller:
         
         return params
     
-    def _infer_trigger(self, instruction: str) -> 'TriggerCondition':
+    def _infer_trigger(self, instruction: str) -> TriggerCondition:
         """推断触发条件"""
-        from skills.declarative_skill import TriggerCondition
-        
         keywords = []
         intents = []
         
         # 提取关键词
-        for app, kws in self.APP_KEYWORDS.items():
-            if any(kw in instruction for kw in kws):
-                keywords.append(app)
-        
-        for action, kws in self.ACTION_KEYWORDS.items():
-            if any(kw in instruction for kw in kws):
-                keywords.append(action)
+        apps, actions = self._match_keywords(instruction)
+        keywords.extend(apps)
+        keywords.extend(actions)
         
         # 生成意图变体
         intents.append(instruction)
-        intents.append(re.sub(r'\d+', 'N', instruction))  # 数字替换
+        intents.append(_NUM_RE.sub('N', instruction))  # 数字替换
         
         return TriggerCondition(
             keywords=keywords,
@@ -313,19 +335,10 @@ class BidirectionalDistiller:
     
     def _extract_tags(self, instruction: str) -> List[str]:
         """提取标签"""
-        tags = []
-        
-        # 应用标签
-        for app, kws in self.APP_KEYWORDS.items():
-            if any(kw in instruction for kw in kws):
-                tags.append(app)
-        
-        # 动作标签
-        for action, kws in self.ACTION_KEYWORDS.items():
-            if any(kw in instruction for kw in kws):
-                tags.append(action)
-        
-        return list(set(tags))
+        apps, actions = self._match_keywords(instruction)
+        tags = set(apps)
+        tags.update(actions)
+        return list(tags)
     
     def _generate_constraints(self, analysis: Dict[str, Any]) -> List[str]:
         """生成约束条件"""
@@ -350,11 +363,7 @@ class BidirectionalDistiller:
         
         # 替换循环次数为参数
         if analysis['has_loop'] and analysis['loop_count']:
-            result = re.sub(
-                r'range\(\d+\)',
-                'range(count)',
-                result
-            )
+            result = _RANGE_RE.sub('range(count)', result)
         
         return result
 
@@ -6,16 +6,28 @@
 """
 
 import os
+import hmac
+import json
 import uuid
+import itertools
 import logging
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Set
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
+# 安装了 orjson 时用它序列化响应 (原生实现，大列表响应明显更快)
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    orjson = None
+    from fastapi.responses import JSONResponse as DefaultResponse
+
 # 假设我们有数据库模块
 # from .database import get_db, SkillModel
 
@@ -98,14 +110,87 @@ class StatsUpdate(BaseModel):
 # 生产环境应替换为数据库
 
 class InMemoryStore:
-    """内存存储（示例用）"""
+    """内存存储（示例用）
+    
+    搜索使用字符 n-gram 倒排索引 (单字 + 相邻两字) 先筛出候选技能，
+    再对候选逐个做原有的子串匹配打分。中文文本没有空格分词，
+    按字符切分才能保持 "子串命中" 的原有语义。
+    """
     
     def __init__(self):
         self._skills: dict = {}
         self._embeddings: dict = {}
+        # gram -> 技能 ID 集合
+        self._gram_idx: Dict[str, Set[str]] = {}
+        # 技能 ID -> 已索引的 gram (数据可能被原地修改，删除旧索引时不能重新计算)
+        self._grams_of: Dict[str, Set[str]] = {}
+        # 技能 ID -> 插入序号，候选按原存储顺序打分，同分结果顺序不变
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        # 名称 -> 技能 ID，同名时取最先插入的一个 (与按顺序遍历查找一致)
+        self._by_name: Dict[str, str] = {}
+        self._names: Dict[str, str] = {}
+        # 名称 -> 同名技能 ID 集合，删除或改名时从中选出接替者
+        self._name_ids: Dict[str, Set[str]] = {}
+    
+    @staticmethod
+    def _grams(text: str) -> Set[str]:
+        """文本的单字和相邻两字 gram"""
+        grams = set(text)
+        grams.update(text[i:i + 2] for i in range(len(text) - 1))
+        return grams
+    
+    def _index(self, skill_id: str, data: dict):
+        fields = [data.get("name", ""), data.get("description", "")]
+        fields.extend(data.get("tags", []))
+        # 字段之间用 \0 分隔，避免拼出跨字段的 gram
+        grams = self._grams("\0".join(fields).lower())
+        self._grams_of[skill_id] = grams
+        for gram in grams:
+            self._gram_idx.setdefault(gram, set()).add(skill_id)
+    
+    def _unindex(self, skill_id: str):
+        for gram in self._grams_of.pop(skill_id, ()):
+            postings = self._gram_idx[gram]
+            postings.discard(skill_id)
+            if not postings:
+                del self._gram_idx[gram]
+    
+    def _index_name(self, skill_id: str, data: dict):
+        name = data.get("name")
+        self._names[skill_id] = name
+        self._name_ids.setdefault(name, set()).add(skill_id)
+        owner = self._by_name.get(name)
+        if owner is None or self._seq[skill_id] < self._seq[owner]:
+            self._by_name[name] = skill_id
+    
+    def _unindex_name(self, skill_id: str):
+        # 数据可能已被原地改名，旧名称从 _names 取
+        if skill_id not in self._names:
+            return
+        name = self._names.pop(skill_id)
+        ids = self._name_ids[name]
+        ids.discard(skill_id)
+        if not ids:
+            del self._name_ids[name]
+            del self._by_name[name]
+        elif self._by_name[name] == skill_id:
+            # 由插入最早的同名技能接替
+            self._by_name[name] = min(ids, key=self._seq.__getitem__)
     
     def save(self, skill_id: str, data: dict):
+        if skill_id not in self._skills:
+            self._seq[skill_id] = self._next_seq
+            self._next_seq += 1
+        # 名称未变时 (更新统计、同步覆盖等) 名称索引无需变动
+        rename = self._names.get(skill_id, self) != data.get("name")
+        self._unindex(skill_id)
+        if rename:
+            self._unindex_name(skill_id)
         self._skills[skill_id] = data
+        self._index(skill_id, data)
+        if rename:
+            self._index_name(skill_id, data)
     
     def get(self, skill_id: str) -> Optional[dict]:
         return self._skills.get(skill_id)
@@ -113,18 +198,44 @@ class InMemoryStore:
     def delete(self, skill_id: str) -> bool:
         if skill_id in self._skills:
             del self._skills[skill_id]
+            self._unindex(skill_id)
+            self._unindex_name(skill_id)
+            del self._seq[skill_id]
             return True
         return False
     
     def list_all(self) -> List[dict]:
         return list(self._skills.values())
     
+    def get_by_name(self, name: str) -> Optional[dict]:
+        skill_id = self._by_name.get(name)
+        return None if skill_id is None else self._skills[skill_id]
+    
+    def _candidates(self, query_lower: str) -> List[str]:
+        """包含查询全部 gram 的技能 ID，按插入顺序排列"""
+        if not query_lower:
+            return list(self._skills)
+        if len(query_lower) == 1:
+            grams = {query_lower}
+        else:
+            grams = {query_lower[i:i + 2] for i in range(len(query_lower) - 1)}
+        
+        # 从最短的倒排表开始求交集
+        postings = sorted((self._gram_idx.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            if not candidates:
+                break
+            candidates &= p
+        return sorted(candidates, key=self._seq.__getitem__)
+    
     def search(self, query: str, limit: int = 10) -> List[tuple]:
         """简单关键词搜索"""
         results = []
         query_lower = query.lower()
         
-        for skill_id, skill in self._skills.items():
+        for skill_id in self._candidates(query_lower):
+            skill = self._skills[skill_id]
             score = 0.0
             matched = ""
             
@@ -163,7 +274,8 @@ app = FastAPI(
     title="Skill Cloud Service",
     description="多设备共享技能库云服务",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=DefaultResponse
 )
 
 # CORS 配置
@@ -178,14 +290,17 @@ app.add_middleware(
 
 # ========== 认证依赖 ==========
 
+# 服务启动时读取一次
+_EXPECTED_API_KEY = os.getenv("SKILL_API_KEY", "dev-key").encode('utf-8')
+
+
 async def verify_api_key(x_api_key: str = Header(None)):
     """验证 API Key"""
-    expected_key = os.getenv("SKILL_API_KEY", "dev-key")
-    
     if not x_api_key:
         raise HTTPException(status_code=401, detail="Missing API key")
     
-    if x_api_key != expected_key:
+    # 常量时间比较，避免通过响应耗时逐字节猜测密钥
+    if not hmac.compare_digest(x_api_key.encode('utf-8'), _EXPECTED_API_KEY):
         raise HTTPException(status_code=403, detail="Invalid API key")
     
     return x_api_key
@@ -210,21 +325,27 @@ async def list_skills(
     offset: int = Query(0, ge=0),
     _: str = Depends(verify_api_key)
 ):
-    """列出所有技能"""
-    skills = store.list_all()
+    """列出所有技能
+    
+    结果以流式 JSON 数组返回，边序列化边发送，不先构造整个响应列表。
+    """
+    skills = iter(store.list_all())
     
     # 标签过滤
     if tags:
         tag_list = [t.strip() for t in tags.split(",")]
-        skills = [
+        skills = (
             s for s in skills
             if any(t in s.get("tags", []) for t in tag_list)
-        ]
+        )
     
     # 分页
-    skills = skills[offset:offset + limit]
+    skills = itertools.islice(skills, offset, offset + limit)
     
-    return [_to_response(s) for s in skills]
+    return StreamingResponse(
+        _iter_json_array(_response_fields(s) for s in skills),
+        media_type="application/json"
+    )
 
 
 @app.get("/skills/{skill_id}", response_model=SkillResponse)
@@ -326,7 +447,7 @@ async def search_skills(
         ]
     
     return [
-        SearchResult(
+        SearchResult.model_construct(
             skill=_to_response(skill),
             score=score,
             matched_field=matched
@@ -343,14 +464,12 @@ async def sync_skills(
     """同步技能"""
     updated = []
     conflicts = []
+    # 整个同步请求共用一个时间戳
+    now = datetime.now().isoformat()
     
     for skill_data in request.skills:
         # 检查是否已存在
-        existing = None
-        for s in store.list_all():
-            if s.get("name") == skill_data.name:
-                existing = s
-                break
+        existing = store.get_by_name(skill_data.name)
         
         if existing:
             # 冲突检测（简化版）
@@ -364,14 +483,13 @@ async def sync_skills(
                 "code": skill_data.code,
                 "tags": skill_data.tags,
                 "parameters": skill_data.parameters,
-                "updated_at": datetime.now().isoformat()
+                "updated_at": now
             })
             store.save(existing["id"], existing)
             updated.append(_to_response(existing))
         else:
             # 创建新技能
             skill_id = str(uuid.uuid4())[:8]
-            now = datetime.now().isoformat()
             
             data = {
                 "id": skill_id,
@@ -393,7 +511,7 @@ async def sync_skills(
         updated=updated,
         deleted=[],
         conflicts=conflicts,
-        server_time=datetime.now().isoformat()
+        server_time=now
     )
 
 
@@ -419,21 +537,47 @@ async def update_stats(
 
 # ========== 辅助函数 ==========
 
+def _response_fields(skill: dict) -> dict:
+    """提取响应字段 (缺失字段取默认值)"""
+    return {
+        "id": skill.get("id", ""),
+        "name": skill.get("name", ""),
+        "description": skill.get("description", ""),
+        "code": skill.get("code", ""),
+        "tags": skill.get("tags", []),
+        "parameters": skill.get("parameters", {}),
+        "source_device": skill.get("source_device", ""),
+        "created_at": skill.get("created_at", ""),
+        "updated_at": skill.get("updated_at", ""),
+        "use_count": skill.get("use_count", 0),
+        "success_count": skill.get("success_count", 0)
+    }
+
+
 def _to_response(skill: dict) -> SkillResponse:
-    """转换为响应模型"""
-    return SkillResponse(
-        id=skill.get("id", ""),
-        name=skill.get("name", ""),
-        description=skill.get("description", ""),
-        code=skill.get("code", ""),
-        tags=skill.get("tags", []),
-        parameters=skill.get("parameters", {}),
-        source_device=skill.get("source_device", ""),
-        created_at=skill.get("created_at", ""),
-        updated_at=skill.get("updated_at", ""),
-        use_count=skill.get("use_count", 0),
-        success_count=skill.get("success_count", 0)
-    )
+    """转换为响应模型
+    
+    存储的记录在创建/更新时已经过请求模型校验，这里用 model_construct
+    跳过逐字段校验；路由的 response_model 仍会在输出时做最终校验。
+    """
+    return SkillResponse.model_construct(**_response_fields(skill))
+
+
+def _json_bytes(obj) -> bytes:
+    """序列化为 JSON 字节串 (优先使用 orjson)"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _iter_json_array(items):
+    """逐项序列化，生成一个 JSON 数组的字节流"""
+    yield b"["
+    for i, item in enumerate(items):
+        if i:
+            yield b","
+        yield _json_bytes(item)
+    yield b"]"
 
 
 # ========== 启动入口 ==========
@@ -441,9 +585,12 @@ def _to_response(skill: dict) -> SkillResponse:
 if __name__ == "__main__":
     import uvicorn
     
+    # loop/http 默认为 "auto"，安装了 uvloop/httptools 时 uvicorn 会自动选用
     uvicorn.run(
         "cloud_service:app",
         host="0.0.0.0",
         port=8080,
-        reload=True
+        reload=os.getenv("SKILL_SERVICE_RELOAD", "0") == "1",
+        # InMemoryStore 的数据在进程内，多个 worker 之间不共享；换成数据库后再调大
+        workers=int(os.getenv("SKILL_SERVICE_WORKERS", "1"))
     )
@@ -11,19 +11,41 @@
 - 偏好/约束声明
 """
 
+import os
+import copy
 import json
 import hashlib
 import logging
-from typing import Optional, List, Dict, Any, Set
-from dataclasses import dataclass, field, asdict
+from typing import Optional, List, Dict, Any, Set, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from enum import Enum
 
+# 安装了 orjson 时用它读写索引和日志 (原生实现，大索引加载更快)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 logger = logging.getLogger(__name__)
 
 
+def _json_loads(data: bytes) -> Any:
+    """解析 UTF-8 JSON 字节串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """序列化为 UTF-8 JSON 字节串 (非 ASCII 字符不转义)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+
 class SkillType(Enum):
     """技能类型"""
     ATOMIC = "atomic"          # 原子技能（不可分解）
@@ -38,22 +60,49 @@ class TriggerCondition:
     intents: List[str] = field(default_factory=list)     # 意图触发
     contexts: List[str] = field(default_factory=list)    # 上下文触发
     
+    def __post_init__(self):
+        self._lower_key = None
+        self._lower = None
+    
+    def _lowered(self) -> Tuple[List[str], List[Set[str]]]:
+        """小写的关键词和意图词集合
+        
+        按 keywords/intents 的内容缓存，列表被重新赋值或原地修改后自动重新计算；
+        内容未变时只需比较两个元组，匹配时不再逐个 lower()。
+        """
+        key = (tuple(self.keywords), tuple(self.intents))
+        if key != self._lower_key:
+            self._lower_key = key
+            self._lower = (
+                [kw.lower() for kw in self.keywords],
+                [set(intent.lower().split()) for intent in self.intents],
+            )
+        return self._lower
+    
     def matches(self, query: str) -> float:
         """计算匹配分数（0-1）"""
+        return self._matches_lower(query.lower())
+    
+    def _matches_lower(self, query_lower: str) -> float:
+        """计算匹配分数，查询已转为小写"""
         score = 0.0
-        query_lower = query.lower()
+        kw_lower, intent_words = self._lowered()
         
-        # 关键词匹配
-        for kw in self.keywords:
-            if kw.lower() in query_lower:
+        # 关键词匹配 (分数封顶 1.0，达到后不必再检查)
+        for kw in kw_lower:
+            if kw in query_lower:
                 score += 0.3
+                if score >= 1.0:
+                    return 1.0
         
         # 意图匹配（简单实现，可升级为向量相似度）
-        for intent in self.intents:
-            if any(word in query_lower for word in intent.lower().split()):
+        for words in intent_words:
+            if any(word in query_lower for word in words):
                 score += 0.2
+                if score >= 1.0:
+                    return 1.0
         
-        return min(score, 1.0)
+        return score
 
 
 @dataclass
@@ -148,6 +197,20 @@ class DeclarativeSkill:
     # 关联的过程式代码（可选，用于缓存）
     cached_code: Optional[str] = None
     
+    # Prompt 头部 (名称/描述/行为) 只由这些字符串字段决定，重新赋值时清除缓存；
+    # 参数、约束、偏好可能被原地修改，每次都重新生成
+    _PROMPT_FIELDS = frozenset({'name', 'description', 'behavior'})
+    
+    def __setattr__(self, name: str, value: Any):
+        if name in self._PROMPT_FIELDS:
+            object.__setattr__(self, '_prompt_head', None)
+            # 匹配用的小写形式随字段一起更新
+            if name == 'name':
+                object.__setattr__(self, '_name_lower', value.lower())
+            elif name == 'description':
+                object.__setattr__(self, '_desc_words', frozenset(value.lower().split()))
+        object.__setattr__(self, name, value)
+    
     def __post_init__(self):
         if not self.id:
             self.id = self._generate_id()
@@ -167,16 +230,15 @@ class DeclarativeSkill:
         Returns:
             匹配分数 0-1
         """
-        score = self.trigger.matches(query)
+        query_lower = query.lower()
+        score = self.trigger._matches_lower(query_lower)
         
         # 名称匹配加分
-        if self.name.lower() in query.lower():
+        if self._name_lower in query_lower:
             score += 0.3
         
         # 描述匹配加分
-        desc_words = set(self.description.lower().split())
-        query_words = set(query.lower().split())
-        overlap = len(desc_words & query_words)
+        overlap = len(self._desc_words.intersection(query_lower.split()))
         if overlap > 0:
             score += overlap * 0.1
         
@@ -188,11 +250,13 @@ class DeclarativeSkill:
     
     def to_prompt(self) -> str:
         """转换为 LLM 可用的 Prompt 格式"""
-        prompt_parts = [
-            f"## 技能: {self.name}",
-            f"\n### 描述\n{self.description}",
-            f"\n### 行为规范\n{self.behavior}",
-        ]
+        if self._prompt_head is None:
+            self._prompt_head = "\n".join([
+                f"## 技能: {self.name}",
+                f"\n### 描述\n{self.description}",
+                f"\n### 行为规范\n{self.behavior}",
+            ])
+        prompt_parts = [self._prompt_head]
         
         if self.parameters:
             params_str = "\n".join([
@@ -213,12 +277,40 @@ class DeclarativeSkill:
         return "\n".join(prompt_parts)
     
     def to_dict(self) -> Dict:
-        """转换为字典"""
-        data = asdict(self)
-        data['skill_type'] = self.skill_type.value
-        data['trigger'] = asdict(self.trigger)
-        data['preferences'] = [asdict(p) for p in self.preferences]
-        return data
+        """转换为字典
+        
+        逐字段构建，不走 asdict 的递归深拷贝；列表做浅拷贝 (元素都是字符串)，
+        只有可能嵌套的 parameters 深拷贝，结果与 asdict 相同。
+        """
+        trigger = self.trigger
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'trigger': {
+                'keywords': list(trigger.keywords),
+                'intents': list(trigger.intents),
+                'contexts': list(trigger.contexts),
+            },
+            'behavior': self.behavior,
+            'parameters': copy.deepcopy(self.parameters),
+            'preferences': [
+                {'name': p.name, 'description': p.description,
+                 'enabled': p.enabled, 'priority': p.priority}
+                for p in self.preferences
+            ],
+            'constraints': list(self.constraints),
+            'requires': list(self.requires),
+            'skill_type': self.skill_type.value,
+            'tags': list(self.tags),
+            'version': self.version,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'author': self.author,
+            'usage_count': self.usage_count,
+            'success_rate': self.success_rate,
+            'cached_code': self.cached_code,
+        }
     
     @classmethod
     def from_dict(cls, data: Dict) -> 'DeclarativeSkill':
@@ -236,13 +328,32 @@ class DeclarativeSkill:
         return cls(**data)
 
 
+# 前缀树节点中存放技能 ID 集合的键 (普通键都是单个字符，不会冲突)
+_TRIE_IDS = None
+
+
 class DeclarativeSkillRegistry:
     """声明式技能注册表
     
     管理声明式技能，支持语义匹配和技能组合。
+    
+    持久化采用 "索引文件 + 追加日志":
+    - 注册时只把该技能追加到日志文件 (一行一个 JSON)，不重写整个索引
+    - 日志超过索引文件 2 倍大小时合并 (compact)，重写索引并清空日志
+    - 加载时先读索引，再按顺序重放日志
+    
+    意图匹配时先用索引筛出候选技能，只对候选调用 matches() 打分:
+    - 前缀树: 关键词、意图词、技能名 (小写)，命中条件是它们作为子串出现在查询中
+    - 描述词表: 描述按空白切分后的词，命中条件是与查询词相同
+    两者都不命中的技能 matches() 得分必为 0。
+    
+    索引在注册时建立。原地修改已注册技能的触发条件、名称、描述或依赖后，
+    需调用 reindex(skill_id) 刷新索引 (或重新 register()，同时持久化)，
+    否则按新关键词匹配不到该技能。
     """
     
     INDEX_FILE = "declarative_index.json"
+    JOURNAL_FILE = "declarative_journal.ndjson"
     
     def __init__(self, storage_path: str = "./skill_store"):
         self.storage_path = Path(storage_path)
@@ -251,57 +362,210 @@ class DeclarativeSkillRegistry:
         self.skills: Dict[str, DeclarativeSkill] = {}
         self._dependency_graph: Dict[str, Set[str]] = {}  # 依赖图
         
+        # 意图匹配索引
+        self._trie: Dict = {}
+        self._desc_idx: Dict[str, Set[str]] = {}
+        self._indexed_terms: Dict[str, Tuple[Set[str], Set[str]]] = {}
+        self._seq: Dict[str, int] = {}  # 注册顺序，同分结果保持原有顺序
+        
+        # 名称索引: 同名技能取最先注册的一个，与按顺序遍历查找一致
+        self._by_name: Dict[str, DeclarativeSkill] = {}
+        self._names: Dict[str, str] = {}
+        self._name_ids: Dict[str, Set[str]] = {}  # 名称 -> 同名技能 ID，用于选出接替者
+        
+        # 索引文件和日志文件的字节数，用于判断何时合并
+        self._index_bytes = 0
+        self._journal_bytes = 0
+        
         self._load_index()
     
+    def _add_skill(self, skill: DeclarativeSkill):
+        """把技能放入内存结构 (不写盘)"""
+        self.skills[skill.id] = skill
+        self._update_dependency_graph(skill)
+        self._index_skill(skill)
+    
     def _load_index(self):
-        """加载索引"""
+        """加载索引并重放日志"""
         index_path = self.storage_path / self.INDEX_FILE
         if index_path.exists():
             try:
-                with open(index_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                with open(index_path, 'rb') as f:
+                    data = _json_loads(f.read())
                     for skill_data in data.get('skills', []):
-                        skill = DeclarativeSkill.from_dict(skill_data)
-                        self.skills[skill.id] = skill
-                        self._update_dependency_graph(skill)
-                logger.info(f"[DeclarativeRegistry] Loaded {len(self.skills)} skills")
+                        self._add_skill(DeclarativeSkill.from_dict(skill_data))
+                self._index_bytes = index_path.stat().st_size
             except Exception as e:
                 logger.error(f"[DeclarativeRegistry] Load error: {e}")
+        
+        journal_path = self.storage_path / self.JOURNAL_FILE
+        corrupted = False
+        if journal_path.exists():
+            with open(journal_path, 'rb') as f:
+                for line in f:
+                    self._journal_bytes += len(line)
+                    try:
+                        self._add_skill(DeclarativeSkill.from_dict(_json_loads(line)))
+                    except Exception as e:
+                        # 写入中途崩溃可能留下不完整的最后一行
+                        logger.warning(f"[DeclarativeRegistry] Skipping bad journal entry: {e}")
+                        corrupted = True
+        
+        # 立即合并，避免后续追加的记录接在残缺行后面
+        if corrupted:
+            self.compact()
+        
+        if self.skills:
+            logger.info(f"[DeclarativeRegistry] Loaded {len(self.skills)} skills")
     
     def _save_index(self):
-        """保存索引"""
+        """保存索引 (写临时文件后原子替换)"""
         index_path = self.storage_path / self.INDEX_FILE
+        tmp_path = index_path.with_suffix('.tmp')
         data = {
             'version': '2.0',
             'type': 'declarative',
             'updated_at': datetime.now().isoformat(),
             'skills': [s.to_dict() for s in self.skills.values()]
         }
-        with open(index_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(tmp_path, 'wb') as f:
+            f.write(_json_dumps(data, indent=True))
+        os.replace(tmp_path, index_path)
+        self._index_bytes = index_path.stat().st_size
+    
+    def _append_journal(self, skills: List[DeclarativeSkill]):
+        """把注册的技能追加到日志 (一次写入)，日志过大时合并"""
+        data = b"".join(_json_dumps(skill.to_dict()) + b"\n" for skill in skills)
+        with open(self.storage_path / self.JOURNAL_FILE, 'ab') as f:
+            f.write(data)
+        self._journal_bytes += len(data)
+        
+        if self._journal_bytes > 2 * self._index_bytes:
+            self.compact()
+    
+    def compact(self):
+        """把日志合并进索引文件并清空日志
+        
+        先原子替换索引再清空日志；两步之间中断时，重放日志只会重复
+        已在索引中的注册，结果不变。
+        """
+        self._save_index()
+        with open(self.storage_path / self.JOURNAL_FILE, 'wb'):
+            pass
+        self._journal_bytes = 0
     
     def _update_dependency_graph(self, skill: DeclarativeSkill):
         """更新依赖图"""
         self._dependency_graph[skill.id] = set(skill.requires)
     
+    def _index_skill(self, skill: DeclarativeSkill):
+        """把技能加入意图匹配索引 (已存在则先移除旧条目，名称未变时名称索引原地更新)"""
+        same_name = skill.id in self._names and self._names[skill.id] == skill.name
+        self._unindex_skill(skill.id, keep_name=same_name)
+        self._seq.setdefault(skill.id, len(self._seq))
+        
+        kw_lower, intent_words = skill.trigger._lowered()
+        needles = set(kw_lower)
+        needles.update(*intent_words)
+        needles.add(skill._name_lower)
+        desc_words = skill._desc_words
+        self._indexed_terms[skill.id] = (needles, desc_words)
+        
+        for needle in needles:
+            node = self._trie
+            for ch in needle:
+                node = node.setdefault(ch, {})
+            node.setdefault(_TRIE_IDS, set()).add(skill.id)
+        for word in desc_words:
+            self._desc_idx.setdefault(word, set()).add(skill.id)
+        
+        if same_name:
+            if self._by_name[skill.name].id == skill.id:
+                self._by_name[skill.name] = skill
+            return
+        
+        self._names[skill.id] = skill.name
+        self._name_ids.setdefault(skill.name, set()).add(skill.id)
+        owner = self._by_name.get(skill.name)
+        if owner is None or self._seq[skill.id] < self._seq[owner.id]:
+            self._by_name[skill.name] = skill
+    
+    def _unindex_skill(self, skill_id: str, keep_name: bool = False):
+        """从意图匹配索引中移除技能 (keep_name 时保留名称索引)"""
+        needles, desc_words = self._indexed_terms.pop(skill_id, ((), ()))
+        for needle in needles:
+            node = self._trie
+            for ch in needle:
+                node = node[ch]
+            node[_TRIE_IDS].discard(skill_id)
+        for word in desc_words:
+            self._desc_idx[word].discard(skill_id)
+        
+        if keep_name or skill_id not in self._names:
+            return
+        name = self._names.pop(skill_id)
+        ids = self._name_ids[name]
+        ids.discard(skill_id)
+        if not ids:
+            del self._name_ids[name]
+            del self._by_name[name]
+        elif self._by_name[name].id == skill_id:
+            # 由注册最早的同名技能接替
+            self._by_name[name] = self.skills[min(ids, key=self._seq.__getitem__)]
+    
+    def _intent_candidates(self, query: str) -> Set[str]:
+        """可能与查询匹配 (得分大于 0) 的技能 ID"""
+        query_lower = query.lower()
+        candidates = set(self._trie.get(_TRIE_IDS, ()))  # 空字符串是任何查询的子串
+        
+        # 从查询的每个位置出发沿前缀树向下走，收集途经的所有词条
+        for start in range(len(query_lower)):
+            node = self._trie
+            for ch in query_lower[start:]:
+                node = node.get(ch)
+                if node is None:
+                    break
+                ids = node.get(_TRIE_IDS)
+                if ids:
+                    candidates |= ids
+        
+        for word in set(query_lower.split()):
+            ids = self._desc_idx.get(word)
+            if ids:
+                candidates |= ids
+        return candidates
+    
     def register(self, skill: DeclarativeSkill) -> str:
         """注册技能"""
-        self.skills[skill.id] = skill
-        self._update_dependency_graph(skill)
-        self._save_index()
+        self._add_skill(skill)
+        self._append_journal([skill])
         logger.info(f"[DeclarativeRegistry] Registered: {skill.name} ({skill.id})")
         return skill.id
     
+    def register_many(self, skills: List[DeclarativeSkill]) -> List[str]:
+        """批量注册技能，所有记录一次写入日志"""
+        for skill in skills:
+            self._add_skill(skill)
+        if skills:
+            self._append_journal(skills)
+            logger.info(f"[DeclarativeRegistry] Registered {len(skills)} skills")
+        return [skill.id for skill in skills]
+    
+    def reindex(self, skill_id: str) -> bool:
+        """原地修改已注册技能后刷新其匹配索引 (不写盘，需要持久化时重新 register)"""
+        skill = self.skills.get(skill_id)
+        if skill is None:
+            return False
+        self._add_skill(skill)
+        return True
+    
     def get(self, skill_id: str) -> Optional[DeclarativeSkill]:
         """获取技能"""
         return self.skills.get(skill_id)
     
     def find_by_name(self, name: str) -> Optional[DeclarativeSkill]:
         """按名称查找"""
-        for skill in self.skills.values():
-            if skill.name == name:
-                return skill
-        return None
+        return self._by_name.get(name)
     
     def match_intent(self, query: str, threshold: float = 0.3) -> List[DeclarativeSkill]:
         """语义意图匹配
@@ -313,8 +577,16 @@ class DeclarativeSkillRegistry:
         Returns:
             匹配的技能列表（按分数排序）
         """
+        # 每次都对候选重新打分 (不缓存结果)，技能被原地修改后得分立即生效
+        if threshold <= 0:
+            # 得分为 0 的技能也要返回，索引筛选不适用
+            candidates = list(self.skills.values())
+        else:
+            ids = sorted(self._intent_candidates(query), key=self._seq.__getitem__)
+            candidates = [self.skills[sid] for sid in ids]
+        
         results = []
-        for skill in self.skills.values():
+        for skill in candidates:
             score = skill.matches(query)
             if score >= threshold:
                 results.append((skill, score))
@@ -323,22 +595,35 @@ class DeclarativeSkillRegistry:
         return [s for s, _ in results]
     
     def get_dependencies(self, skill_id: str) -> List[DeclarativeSkill]:
-        """获取技能的所有依赖（递归）"""
-        visited = set()
-        result = []
+        """获取技能的所有依赖（递归）
         
-        def dfs(sid: str):
-            if sid in visited:
-                return
-            visited.add(sid)
-            
-            skill = self.find_by_name(sid) or self.get(sid)
-            if skill:
-                for dep in skill.requires:
-                    dfs(dep)
+        requires 中按名称引用依赖，查询时再解析 (依赖可能晚于本技能注册)。
+        用显式栈做后序遍历，依赖在前、依赖它的技能在后，不受递归深度限制。
+        """
+        def resolve(sid: str) -> Optional[DeclarativeSkill]:
+            return self._by_name.get(sid) or self.skills.get(sid)
+        
+        visited = {skill_id}
+        root = resolve(skill_id)
+        if root is None:
+            return []
+        
+        result = []
+        stack = [(root, iter(root.requires))]
+        while stack:
+            skill, deps = stack[-1]
+            for dep in deps:
+                if dep in visited:
+                    continue
+                visited.add(dep)
+                dep_skill = resolve(dep)
+                if dep_skill is not None:
+                    stack.append((dep_skill, iter(dep_skill.requires)))
+                    break
+            else:
+                stack.pop()
                 result.append(skill)
         
-        dfs(skill_id)
         return result[:-1]  # 排除自身
     
     def compose_skill(
@@ -488,9 +773,10 @@ BUILTIN_SKILLS = [
 
 def load_builtin_skills(registry: DeclarativeSkillRegistry):
     """加载内置技能"""
-    for skill in BUILTIN_SKILLS:
-        if not registry.find_by_name(skill.name):
-            registry.register(skill)
+    registry.register_many([
+        skill for skill in BUILTIN_SKILLS
+        if not registry.find_by_name(skill.name)
+    ])
     logger.info(f"[Builtin] Loaded {len(BUILTIN_SKILLS)} builtin skills")
 
 
@@ -7,15 +7,124 @@
 
 import os
 import json
+import heapq
+import hashlib
+import operator
 import logging
-from typing import Optional, List
+import threading
+from typing import Optional, List, Dict
 from datetime import datetime
-from dataclasses import asdict
 
 from .protocols import Skill, SkillMatch, SkillStore, SyncStatus
 
+# 安装了 orjson 时用它读写技能、索引和嵌入文件 (原生实现，编解码更快)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，缺失时退化为纯 Python 逐条计算
+    np = None
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba 为可选依赖，缺失时使用 numpy 矩阵乘法
+    njit = None
+
+# 单次嵌入请求的最大文本数（OpenAI embeddings 接口上限）
+EMBED_BATCH_SIZE = 2048
+
+# 技能数达到该规模后才使用 numba 内核（避免小规模下的 JIT 编译开销）
+NUMBA_MIN_SKILLS = 2048
+
+if njit is not None:
+    @njit(cache=True, parallel=True, fastmath=True)
+    def _dot_scores(matrix, query):
+        """逐行点积 (矩阵行与查询均已归一化，即余弦相似度)"""
+        n, d = matrix.shape
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            s = 0.0
+            for j in range(d):
+                s += matrix[i, j] * query[j]
+            scores[i] = s
+        return scores
+else:
+    _dot_scores = None
+
 logger = logging.getLogger(__name__)
 
+# 进程内共享的嵌入客户端（复用同一个 HTTP 连接池）；False 表示 SDK 未安装
+_EMBEDDING_CLIENT = None
+_EMBEDDING_CLIENT_LOCK = threading.Lock()
+
+
+def _shared_embedding_client():
+    """获取共享的 OpenAI 嵌入客户端，不可用时返回 None"""
+    global _EMBEDDING_CLIENT
+    with _EMBEDDING_CLIENT_LOCK:
+        if _EMBEDDING_CLIENT is None:
+            try:
+                from openai import OpenAI
+                _EMBEDDING_CLIENT = OpenAI()
+            except ImportError:
+                logger.warning("[LocalStore] OpenAI not installed, using mock embeddings")
+                _EMBEDDING_CLIENT = False
+            except Exception as e:
+                logger.warning(f"[LocalStore] Failed to init OpenAI: {e}")
+                return None
+        return _EMBEDDING_CLIENT or None
+
+
+def _quantize(vector: List[float]) -> dict:
+    """将浮点向量量化为 int8（对称量化，每个向量一个缩放系数）"""
+    peak = max((abs(x) for x in vector), default=0.0)
+    scale = peak / 127 if peak > 0 else 1.0
+    return {"q": [round(x / scale) for x in vector], "scale": scale}
+
+
+def _dequantize(entry: dict) -> List[float]:
+    """将 int8 量化向量还原为浮点向量"""
+    scale = entry["scale"]
+    return [v * scale for v in entry["q"]]
+
+
+def _json_loads(data: bytes):
+    """解析 UTF-8 JSON 字节串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _json_dumps(obj, indent: bool = False) -> bytes:
+    """序列化为 UTF-8 JSON 字节串 (非 ASCII 字符不转义，不缩进时不留空白)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _read_json(path: str):
+    """读取 JSON 文件"""
+    with open(path, 'rb') as f:
+        return _json_loads(f.read())
+
+
+def _write_atomic(path: str, data: bytes):
+    """先写临时文件再替换，避免中途中断留下半截文件"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _encode_entry(skill_id: str, entry: dict) -> bytes:
+    """将一条量化向量编码为 embeddings.json 中的 `"id":{...}` 片段"""
+    return _json_dumps(skill_id) + b':' + _json_dumps(entry)
+
 
 class LocalSkillStore(SkillStore):
     """本地文件存储实现
@@ -26,7 +135,7 @@ class LocalSkillStore(SkillStore):
         │   ├── {skill_id}.json
         │   └── ...
         ├── index.json          # 技能索引
-        └── embeddings.json     # 向量缓存
+        └── embeddings.json     # 向量缓存（int8 量化）
     
     Usage:
         store = LocalSkillStore("./data/skills")
@@ -51,18 +160,35 @@ class LocalSkillStore(SkillStore):
         # 加载索引
         self._index: dict = self._load_index()
         
+        # 已加载技能的内存缓存（写穿透，每个技能文件最多读取一次）
+        self._skills: Dict[str, Skill] = {}
+        
+        # 关键词搜索用的小写文本 (name, description, tags)，随技能缓存一起维护
+        self._haystacks: Dict[str, tuple] = {}
+        
         # 加载嵌入缓存
         self._embeddings: dict = self._load_embeddings()
         
-        # 嵌入客户端（延迟初始化）
+        # 索引/嵌入缓存的待写标记（批量写入时只在 flush 时落盘一次）
+        self._index_dirty = False
+        self._embeddings_dirty = False
+        
+        # 嵌入矩阵（numpy 可用时首次搜索构建，之后随嵌入变化逐行更新）
+        self._matrix = None
+        self._matrix_ids: List[str] = []
+        self._matrix_rows: Dict[str, int] = {}
+        
+        # 技能向量的 L2 范数（无 numpy 时的逐条计算路径使用，按需缓存）
+        self._norms: Dict[str, float] = {}
+        
+        # 嵌入客户端（为 None 时使用进程内共享的客户端）
         self._embedding_client = None
     
     def _load_index(self) -> dict:
         """加载技能索引"""
         if os.path.exists(self.index_path):
             try:
-                with open(self.index_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return _read_json(self.index_path)
             except Exception as e:
                 logger.warning(f"[LocalStore] Failed to load index: {e}")
         return {"skills": {}, "updated_at": None}
@@ -70,31 +196,58 @@ class LocalSkillStore(SkillStore):
     def _save_index(self):
         """保存技能索引"""
         self._index["updated_at"] = datetime.now().isoformat()
-        with open(self.index_path, 'w', encoding='utf-8') as f:
-            json.dump(self._index, f, ensure_ascii=False, indent=2)
+        _write_atomic(self.index_path, _json_dumps(self._index, indent=True))
+        self._index_dirty = False
     
     def _load_embeddings(self) -> dict:
-        """加载嵌入缓存"""
+        """加载嵌入缓存
+        
+        磁盘上的向量以 int8 + 缩放系数存储，加载时还原为浮点向量；
+        兼容旧版直接存储浮点列表的格式。每条向量编码后的 JSON 片段
+        单独缓存，保存时只需拼接，不必重新序列化所有向量。
+        条目中的 "h" 是生成该向量的嵌入文本哈希，文本未变时跳过重新嵌入。
+        """
+        self._encoded: Dict[str, bytes] = {}
+        self._text_hashes: Dict[str, str] = {}
         if os.path.exists(self.embeddings_path):
             try:
-                with open(self.embeddings_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                data = _read_json(self.embeddings_path)
             except Exception as e:
                 logger.warning(f"[LocalStore] Failed to load embeddings: {e}")
+                return {}
+            
+            embeddings = {}
+            for skill_id, entry in data.items():
+                if isinstance(entry, dict):
+                    self._encoded[skill_id] = _encode_entry(skill_id, entry)
+                    embeddings[skill_id] = _dequantize(entry)
+                    if "h" in entry:
+                        self._text_hashes[skill_id] = entry["h"]
+                elif isinstance(entry, list):
+                    self._encoded[skill_id] = _encode_entry(skill_id, _quantize(entry))
+                    embeddings[skill_id] = entry
+            return embeddings
         return {}
     
     def _save_embeddings(self):
-        """保存嵌入缓存"""
-        with open(self.embeddings_path, 'w', encoding='utf-8') as f:
-            json.dump(self._embeddings, f)
+        """保存嵌入缓存（int8 量化格式）"""
+        _write_atomic(self.embeddings_path, b'{' + b','.join(self._encoded.values()) + b'}')
+        self._embeddings_dirty = False
+    
+    def flush(self):
+        """将待写的索引和嵌入缓存落盘"""
+        if self._index_dirty:
+            self._save_index()
+        if self._embeddings_dirty:
+            self._save_embeddings()
     
     def _get_skill_path(self, skill_id: str) -> str:
         """获取技能文件路径"""
         return os.path.join(self.skills_dir, f"{skill_id}.json")
     
     def _skill_to_dict(self, skill: Skill) -> dict:
-        """将 Skill 转换为字典"""
-        return asdict(skill)
+        """将 Skill 转换为字典（写盘前立即序列化，不需要拷贝）"""
+        return skill.to_dict_view()
     
     def _dict_to_skill(self, data: dict) -> Skill:
         """将字典转换为 Skill"""
@@ -104,14 +257,44 @@ class LocalSkillStore(SkillStore):
     
     def save(self, skill: Skill) -> str:
         """保存技能"""
+        self._write_skill(skill)
+        self._update_embedding(skill)
+        self.flush()
+        
+        logger.info(f"[LocalStore] Saved skill: {skill.id} ({skill.name})")
+        return skill.id
+    
+    def save_many(self, skills: List[Skill]) -> List[str]:
+        """批量保存技能（嵌入按批请求，索引和嵌入缓存只在最后写入一次）"""
+        pending = []
+        for skill in skills:
+            self._write_skill(skill)
+            text = self._embed_text(skill)
+            text_hash = self._text_hash(text)
+            if not self._embedding_is_current(skill.id, text_hash):
+                pending.append((skill.id, text, text_hash))
+        
+        embeddings = self._get_embeddings([text for _, text, _ in pending])
+        if embeddings:
+            for (skill_id, _, text_hash), embedding in zip(pending, embeddings):
+                if embedding:
+                    self._set_embedding(skill_id, embedding, text_hash)
+        self.flush()
+        
+        logger.info(f"[LocalStore] Saved {len(skills)} skills")
+        return [skill.id for skill in skills]
+    
+    def _write_skill(self, skill: Skill):
+        """写入技能文件并更新内存索引（索引标记为待写）"""
         skill_path = self._get_skill_path(skill.id)
         
         # 更新时间戳
         skill.updated_at = datetime.now().isoformat()
         
         # 保存技能文件
-        with open(skill_path, 'w', encoding='utf-8') as f:
-            json.dump(self._skill_to_dict(skill), f, ensure_ascii=False, indent=2)
+        _write_atomic(skill_path, _json_dumps(self._skill_to_dict(skill), indent=True))
+        self._skills[skill.id] = skill
+        self._haystacks[skill.id] = self._haystack(skill)
         
         # 更新索引
         self._index["skills"][skill.id] = {
@@ -119,25 +302,24 @@ class LocalSkillStore(SkillStore):
             "tags": skill.tags,
             "updated_at": skill.updated_at
         }
-        self._save_index()
-        
-        # 生成嵌入
-        self._update_embedding(skill)
-        
-        logger.info(f"[LocalStore] Saved skill: {skill.id} ({skill.name})")
-        return skill.id
+        self._index_dirty = True
     
     def get(self, skill_id: str) -> Optional[Skill]:
         """获取技能"""
+        skill = self._skills.get(skill_id)
+        if skill is not None:
+            return skill
+        
         skill_path = self._get_skill_path(skill_id)
         
         if not os.path.exists(skill_path):
             return None
         
         try:
-            with open(skill_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return self._dict_to_skill(data)
+            skill = self._dict_to_skill(_read_json(skill_path))
+            self._skills[skill_id] = skill
+            self._haystacks[skill_id] = self._haystack(skill)
+            return skill
         except Exception as e:
             logger.error(f"[LocalStore] Failed to load skill {skill_id}: {e}")
             return None
@@ -151,17 +333,24 @@ class LocalSkillStore(SkillStore):
         
         try:
             os.remove(skill_path)
+            self._skills.pop(skill_id, None)
+            self._haystacks.pop(skill_id, None)
             
             # 从索引移除
             if skill_id in self._index["skills"]:
                 del self._index["skills"][skill_id]
-                self._save_index()
+                self._index_dirty = True
             
             # 从嵌入缓存移除
             if skill_id in self._embeddings:
                 del self._embeddings[skill_id]
-                self._save_embeddings()
+                self._norms.pop(skill_id, None)
+                self._text_hashes.pop(skill_id, None)
+                self._encoded.pop(skill_id, None)
+                self._matrix_remove(skill_id)
+                self._embeddings_dirty = True
             
+            self.flush()
             logger.info(f"[LocalStore] Deleted skill: {skill_id}")
             return True
         except Exception as e:
@@ -190,10 +379,16 @@ class LocalSkillStore(SkillStore):
             # 如果无法生成嵌入，退化为关键词匹配
             return self._keyword_search(query, limit)
         
-        # 计算相似度
+        if np is not None:
+            return self._matrix_search(query_embedding, limit)
+        
+        # 计算相似度（查询向量的范数只计算一次）
+        query_norm = sum(x * x for x in query_embedding) ** 0.5
         for skill_id, skill_embedding in self._embeddings.items():
             if isinstance(skill_embedding, list):
-                similarity = self._cosine_similarity(query_embedding, skill_embedding)
+                similarity = self._cosine_similarity(
+                    query_embedding, query_norm, skill_id, skill_embedding
+                )
                 skill = self.get(skill_id)
                 if skill:
                     matches.append(SkillMatch(
@@ -202,9 +397,99 @@ class LocalSkillStore(SkillStore):
                         matched_field="embedding"
                     ))
         
-        # 排序并限制数量
-        matches.sort(key=lambda m: m.score, reverse=True)
-        return matches[:limit]
+        # 只取 top-k，无需整体排序
+        return heapq.nlargest(limit, matches, key=lambda m: m.score)
+    
+    def _matrix_search(self, query_embedding: List[float], limit: int) -> List[SkillMatch]:
+        """基于嵌入矩阵的批量相似度搜索（一次矩阵乘法 + top-k 选择）"""
+        matrix, skill_ids = self._get_matrix(len(query_embedding))
+        if matrix is None or limit <= 0:
+            return []
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+        if _dot_scores is not None and len(skill_ids) >= NUMBA_MIN_SKILLS:
+            scores = _dot_scores(matrix, query)
+        else:
+            scores = matrix @ query
+        
+        k = min(limit, len(skill_ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        matches = []
+        for i in top:
+            skill = self.get(skill_ids[i])
+            if skill:
+                matches.append(SkillMatch(
+                    skill=skill,
+                    score=float(scores[i]),
+                    matched_field="embedding"
+                ))
+        return matches
+    
+    def _get_matrix(self, dim: int):
+        """获取 (N, D) 的 L2 归一化嵌入矩阵，仅包含维度为 dim 的向量"""
+        if self._matrix is None or self._matrix.shape[1] != dim:
+            skill_ids = [
+                skill_id for skill_id, embedding in self._embeddings.items()
+                if isinstance(embedding, list) and len(embedding) == dim
+            ]
+            if not skill_ids:
+                return None, []
+            
+            matrix = np.array([self._embeddings[i] for i in skill_ids], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self._matrix = matrix / norms
+            self._matrix_ids = skill_ids
+            self._matrix_rows = {skill_id: row for row, skill_id in enumerate(skill_ids)}
+        
+        if not self._matrix_ids:
+            return None, []
+        return self._matrix, self._matrix_ids
+    
+    def _matrix_put(self, skill_id: str, embedding: List[float]):
+        """嵌入变化时更新矩阵中对应的行（矩阵尚未构建时不处理）"""
+        if self._matrix is None:
+            return
+        if len(embedding) != self._matrix.shape[1]:
+            # 维度不同的向量不参与当前矩阵
+            self._matrix_remove(skill_id)
+            return
+        
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        
+        row = self._matrix_rows.get(skill_id)
+        if row is None:
+            self._matrix = np.vstack([self._matrix, vector])
+            self._matrix_rows[skill_id] = len(self._matrix_ids)
+            self._matrix_ids.append(skill_id)
+        else:
+            self._matrix[row] = vector
+    
+    def _matrix_remove(self, skill_id: str):
+        """从矩阵中移除一行（用最后一行填补空位）"""
+        if self._matrix is None:
+            return
+        row = self._matrix_rows.pop(skill_id, None)
+        if row is None:
+            return
+        
+        last = len(self._matrix_ids) - 1
+        if row != last:
+            moved = self._matrix_ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._matrix_ids[row] = moved
+            self._matrix_rows[moved] = row
+        self._matrix_ids.pop()
+        self._matrix = self._matrix[:last]
     
     def update_stats(self, skill_id: str, success: bool) -> None:
         """更新使用统计"""
@@ -216,7 +501,9 @@ class LocalSkillStore(SkillStore):
         if success:
             skill.success_count += 1
         
-        self.save(skill)
+        # 统计字段不参与嵌入文本，只重写技能文件和索引，不重新生成嵌入
+        self._write_skill(skill)
+        self.flush()
     
     def get_sync_status(self) -> SyncStatus:
         """获取同步状态（本地存储无同步）"""
@@ -232,15 +519,7 @@ class LocalSkillStore(SkillStore):
     def _get_embedding_client(self):
         """获取嵌入客户端"""
         if self._embedding_client is None:
-            try:
-                from openai import OpenAI
-                self._embedding_client = OpenAI()
-            except ImportError:
-                logger.warning("[LocalStore] OpenAI not installed, using mock embeddings")
-                return None
-            except Exception as e:
-                logger.warning(f"[LocalStore] Failed to init OpenAI: {e}")
-                return None
+            return _shared_embedding_client()
         return self._embedding_client
     
     def _get_embedding(self, text: str) -> Optional[List[float]]:
@@ -259,29 +538,85 @@ class LocalSkillStore(SkillStore):
             logger.warning(f"[LocalStore] Failed to get embedding: {e}")
             return None
     
+    def _get_embeddings(self, texts: List[str]) -> Optional[List[List[float]]]:
+        """批量获取文本嵌入（每 EMBED_BATCH_SIZE 条一次请求）"""
+        client = self._get_embedding_client()
+        if not client or not texts:
+            return None
+        
+        embeddings = []
+        try:
+            for start in range(0, len(texts), EMBED_BATCH_SIZE):
+                response = client.embeddings.create(
+                    model=self.embedding_model,
+                    input=texts[start:start + EMBED_BATCH_SIZE]
+                )
+                embeddings.extend(item.embedding for item in response.data)
+        except Exception as e:
+            logger.warning(f"[LocalStore] Failed to get embeddings: {e}")
+            return None
+        return embeddings
+    
+    @staticmethod
+    def _embed_text(skill: Skill) -> str:
+        """构建技能的嵌入文本"""
+        return f"{skill.name} {skill.description} {' '.join(skill.tags)}"
+    
+    def _text_hash(self, text: str) -> str:
+        """嵌入文本的内容哈希（包含模型名，换模型后不会误用旧向量）"""
+        key = f"{self.embedding_model}\n{text}"
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _embedding_is_current(self, skill_id: str, text_hash: str) -> bool:
+        """技能已有由相同文本生成的嵌入"""
+        return skill_id in self._embeddings and self._text_hashes.get(skill_id) == text_hash
+    
     def _update_embedding(self, skill: Skill):
-        """更新技能的嵌入向量"""
-        # 构建嵌入文本
-        embed_text = f"{skill.name} {skill.description} {' '.join(skill.tags)}"
+        """更新技能的嵌入向量（嵌入文本未变化时跳过）"""
+        text = self._embed_text(skill)
+        text_hash = self._text_hash(text)
+        if self._embedding_is_current(skill.id, text_hash):
+            return
         
-        embedding = self._get_embedding(embed_text)
+        embedding = self._get_embedding(text)
         if embedding:
-            self._embeddings[skill.id] = embedding
-            self._save_embeddings()
-    
-    def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        """计算余弦相似度"""
+            self._set_embedding(skill.id, embedding, text_hash)
+    
+    def _set_embedding(self, skill_id: str, embedding: List[float], text_hash: str):
+        """写入嵌入缓存（嵌入缓存标记为待写）"""
+        self._embeddings[skill_id] = embedding
+        self._norms.pop(skill_id, None)
+        self._text_hashes[skill_id] = text_hash
+        entry = _quantize(embedding)
+        entry["h"] = text_hash
+        self._encoded[skill_id] = _encode_entry(skill_id, entry)
+        self._matrix_put(skill_id, embedding)
+        self._embeddings_dirty = True
+    
+    def _cosine_similarity(
+        self, a: List[float], norm_a: float, skill_id: str, b: List[float]
+    ) -> float:
+        """计算查询向量 a 与技能向量 b 的余弦相似度（b 的范数按技能缓存）"""
         if len(a) != len(b):
             return 0.0
         
-        dot_product = sum(x * y for x, y in zip(a, b))
-        norm_a = sum(x ** 2 for x in a) ** 0.5
-        norm_b = sum(x ** 2 for x in b) ** 0.5
+        norm_b = self._norms.get(skill_id)
+        if norm_b is None:
+            norm_b = self._norms[skill_id] = sum(x * x for x in b) ** 0.5
         
         if norm_a == 0 or norm_b == 0:
             return 0.0
         
-        return dot_product / (norm_a * norm_b)
+        return sum(map(operator.mul, a, b)) / (norm_a * norm_b)
+    
+    @staticmethod
+    def _haystack(skill: Skill) -> tuple:
+        """技能的小写搜索文本"""
+        return (
+            skill.name.lower(),
+            skill.description.lower(),
+            tuple(tag.lower() for tag in skill.tags),
+        )
     
     def _keyword_search(self, query: str, limit: int) -> List[SkillMatch]:
         """关键词搜索（退化方案）"""
@@ -292,27 +627,26 @@ class LocalSkillStore(SkillStore):
             skill = self.get(skill_id)
             if not skill:
                 continue
+            name_lower, desc_lower, tags_lower = self._haystacks[skill_id]
             
             # 计算匹配分数
             score = 0.0
             matched_field = ""
             
             # 名称匹配（最高权重）
-            if query_lower in skill.name.lower():
+            if query_lower in name_lower:
                 score += 0.5
                 matched_field = "name"
             
             # 描述匹配
-            if query_lower in skill.description.lower():
+            if query_lower in desc_lower:
                 score += 0.3
                 matched_field = matched_field or "description"
             
             # 标签匹配
-            for tag in skill.tags:
-                if query_lower in tag.lower():
-                    score += 0.2
-                    matched_field = matched_field or "tags"
-                    break
+            if any(query_lower in tag for tag in tags_lower):
+                score += 0.2
+                matched_field = matched_field or "tags"
             
             if score > 0:
                 matches.append(SkillMatch(
@@ -321,8 +655,7 @@ class LocalSkillStore(SkillStore):
                     matched_field=matched_field
                 ))
         
-        matches.sort(key=lambda m: m.score, reverse=True)
-        return matches[:limit]
+        return heapq.nlargest(limit, matches, key=lambda m: m.score)
 
 
 # ========== Mock 实现（用于测试） ==========
@@ -9,9 +9,15 @@ from typing import Optional, List, Dict, Any, Tuple, Protocol, runtime_checkable
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from enum import Enum
+import sys
+import copy
 import json
 
 
+# Python 3.10+ 的 dataclass 支持直接生成 __slots__，减少高频对象的内存占用
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
 # ============================================================
 # 枚举类型
 # ============================================================
@@ -35,7 +41,7 @@ class SkillSource(Enum):
 # 数据模型
 # ============================================================
 
-@dataclass
+@dataclass(**_SLOTS)
 class Skill:
     """技能定义（过程式）"""
     id: str
@@ -64,16 +70,41 @@ class Skill:
             self.created_at = datetime.now().isoformat()
         if not self.updated_at:
             self.updated_at = self.created_at
+        # 标签高度重复，驻留后所有技能共享同一份字符串
+        self.tags = [sys.intern(tag) for tag in self.tags]
     
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        # 逐字段构建，不走 asdict 的递归；tags 浅拷贝即可，
+        # 只有可能嵌套的 parameters 深拷贝，结果与 asdict 相同
+        data = self.to_dict_view()
+        data['tags'] = list(self.tags)
+        data['parameters'] = copy.deepcopy(self.parameters)
+        return data
+    
+    def to_dict_view(self) -> Dict[str, Any]:
+        """不拷贝的字典视图（tags/parameters 与技能共享），仅供立即序列化使用"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'code': self.code,
+            'tags': self.tags,
+            'parameters': self.parameters,
+            'use_count': self.use_count,
+            'success_count': self.success_count,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'source': self.source,
+            'version': self.version,
+            'device_id': self.device_id,
+        }
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Skill':
         return cls(**data)
     
     def to_json(self) -> str:
-        return json.dumps(self.to_dict(), ensure_ascii=False)
+        return json.dumps(self.to_dict_view(), ensure_ascii=False)
     
     @classmethod
     def from_json(cls, json_str: str) -> 'Skill':
@@ -136,7 +167,7 @@ class DeclarativeSkill:
         return cls(trigger=trigger, **data)
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ExecutionTrace:
     """执行轨迹"""
     instruction: str
@@ -152,7 +183,7 @@ class ExecutionTrace:
             self.timestamp = datetime.now().isoformat()
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class SkillMatch:
     """技能匹配结果"""
     skill: Skill
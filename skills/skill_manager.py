@@ -52,6 +52,9 @@ class SkillManager:
         skill = manager.get_best_match("给张三点赞")  # 获取最佳匹配
     """
     
+    # 相似度达到该分数即视为已存在相同技能，不再蒸馏
+    DUPLICATE_SCORE = 0.9
+    
     def __init__(
         self,
         local_store: SkillStore,
@@ -234,7 +237,7 @@ class SkillManager:
             是否应该蒸馏
         """
         # 检查是否已存在相似技能
-        matches = self.search(task, limit=1, min_score=0.9)
+        matches = self.search(task, limit=1, min_score=self.DUPLICATE_SCORE)
         if matches:
             logger.debug(f"[SkillManager] Similar skill exists: {matches[0].skill.name}")
             return False
@@ -18,6 +18,7 @@ import sys
 import time
 import base64
 import logging
+import functools
 from typing import Optional, Dict, Any, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
@@ -35,6 +36,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def get_zhipu_client(api_key: str):
+    """获取智谱客户端（按 API Key 共享，复用同一个连接池）
+    
+    zhipuai 在首次调用时才导入，未安装时抛出 ImportError。
+    """
+    from zhipuai import ZhipuAI
+    return ZhipuAI(api_key=api_key)
+
+
 # ==================== StepResult 数据类 ====================
 
 @dataclass
@@ -151,19 +162,49 @@ class AutoGLMDriver:
         self.total_steps = 0
         self.total_retries = 0
         
+        # 预取的截图（下一次 Capture 直接使用）
+        self._prefetched_screenshot: Optional[bytes] = None
+        
         logger.info(f"[AutoGLMDriver] 初始化完成，模型: {model}")
     
     def _init_client(self):
         """初始化 AutoGLM 客户端"""
         try:
-            from zhipuai import ZhipuAI
-            self.client = ZhipuAI(api_key=self.api_key)
+            self.client = get_zhipu_client(self.api_key)
             logger.info("[AutoGLMDriver] ✅ AutoGLM 客户端初始化成功")
         except ImportError:
             logger.error("[AutoGLMDriver] ❌ zhipuai 未安装，请运行: pip install zhipuai")
         except Exception as e:
             logger.error(f"[AutoGLMDriver] ❌ 客户端初始化失败: {e}")
     
+    def prefetch_screen(self) -> Optional[bytes]:
+        """预取当前截图
+        
+        在策略层生成代码期间调用，屏幕不会变化，
+        下一次 step()/ask()/checkpoint() 的 Capture 可直接复用该截图。
+        
+        Returns:
+            截图 bytes，失败返回 None
+        """
+        try:
+            self._prefetched_screenshot = self.driver.screenshot()
+        except Exception as e:
+            logger.warning(f"[AutoGLMDriver] 截图预取失败: {e}")
+            self._prefetched_screenshot = None
+        return self._prefetched_screenshot
+    
+    def discard_prefetch(self):
+        """丢弃预取的截图"""
+        self._prefetched_screenshot = None
+    
+    def _capture(self) -> Optional[bytes]:
+        """获取截图，优先使用预取结果（仅使用一次）"""
+        screenshot = self._prefetched_screenshot
+        if screenshot is not None:
+            self._prefetched_screenshot = None
+            return screenshot
+        return self.driver.screenshot()
+    
     def execute_step(self, goal: str, expect: str = None) -> StepResult:
         """执行单步操作 - 微观闭环
         
@@ -199,7 +240,7 @@ class AutoGLMDriver:
             try:
                 # a. Capture: 截图
                 logger.info(f"[AutoGLMDriver] 📸 a. Capture - 获取截图")
-                screenshot = self.driver.screenshot()
+                screenshot = self._capture()
                 if screenshot is None:
                     logger.error("[AutoGLMDriver] ❌ 截图失败")
                     continue
@@ -558,7 +599,7 @@ class AutoGLMDriver:
         """
         logger.info(f"[AutoGLMDriver] 📝 Ask: {question}")
         
-        screenshot = self.driver.screenshot()
+        screenshot = self._capture()
         if screenshot is None:
             return "错误：无法获取截图"
         
@@ -621,7 +662,7 @@ class AutoGLMDriver:
         """
         logger.info(f"[AutoGLMDriver] 🔍 Checkpoint: {description}")
         
-        screenshot = self.driver.screenshot()
+        screenshot = self._capture()
         if screenshot is None:
             logger.error("[AutoGLMDriver] 检查点：截图失败")
             return False
@@ -758,6 +799,9 @@ class AutoGLMDriver:
         """
         action_type = action.action_type
         
+        # 动作会改变界面，预取的截图失效
+        self._prefetched_screenshot = None
+        
         # 这里可以添加安全检查逻辑
         # 例如：检查坐标是否在安全范围内
         
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+云端技能服务测试
+InMemoryStore 的索引与数据变更保持一致
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("fastapi")
+
+from skills.cloud_service import InMemoryStore
+
+
+def _skill(name: str, description: str = "", tags=None) -> dict:
+    return {"name": name, "description": description, "tags": list(tags or [])}
+
+
+def _search_names(store: InMemoryStore, query: str) -> list:
+    return [skill["name"] for skill, _, _ in store.search(query)]
+
+
+def test_search_matches_name_description_and_tags():
+    """测试搜索按名称/描述/标签打分，同分保持插入顺序"""
+    store = InMemoryStore()
+    store.save("a", _skill("微信点赞", "给朋友圈点赞", ["社交"]))
+    store.save("b", _skill("打开设置", "进入系统设置"))
+    store.save("c", _skill("发送消息", "在微信中发消息", ["微信"]))
+    store.save("d", _skill("微信扫码", "扫一扫"))
+    
+    results = store.search("微信")
+    assert [(s["name"], score, matched) for s, score, matched in results] == [
+        ("微信点赞", 0.8, "name"),
+        ("微信扫码", 0.8, "name"),
+        ("发送消息", 0.5, "description"),
+    ]
+    assert _search_names(store, "社交") == ["微信点赞"]
+    assert _search_names(store, "设") == ["打开设置"]
+    assert _search_names(store, "不存在") == []
+
+
+def test_search_after_name_and_description_update():
+    """测试更新名称和描述后，旧文本不再命中、新文本可以命中"""
+    store = InMemoryStore()
+    store.save("a", _skill("微信点赞", "给朋友圈点赞"))
+    store.save("b", _skill("打开设置", "进入系统设置"))
+    
+    store.save("a", _skill("支付宝签到", "每日签到领积分"))
+    assert _search_names(store, "微信") == []
+    assert _search_names(store, "朋友圈") == []
+    assert _search_names(store, "支付宝") == ["支付宝签到"]
+    assert _search_names(store, "积分") == ["支付宝签到"]
+    
+    # 只改描述
+    store.save("b", _skill("打开设置", "调整屏幕亮度"))
+    assert _search_names(store, "系统") == []
+    assert _search_names(store, "亮度") == ["打开设置"]
+    
+    # 更新不改变原有顺序
+    assert _search_names(store, "") == ["支付宝签到", "打开设置"]
+
+
+def test_search_after_delete():
+    """测试删除后不再命中，重新保存的技能排在最后"""
+    store = InMemoryStore()
+    store.save("a", _skill("微信点赞"))
+    store.save("b", _skill("微信扫码"))
+    
+    assert store.delete("a")
+    assert not store.delete("a")
+    assert store.get("a") is None
+    assert _search_names(store, "微信") == ["微信扫码"]
+    assert _search_names(store, "点赞") == []
+    
+    store.save("a", _skill("微信点赞"))
+    assert _search_names(store, "微信") == ["微信扫码", "微信点赞"]
+
+
+def test_get_by_name_with_shared_names():
+    """测试同名技能取最先插入的一个，删除或改名后由下一个接替"""
+    store = InMemoryStore()
+    store.save("a", _skill("打开设置", "v1"))
+    store.save("b", _skill("打开设置", "v2"))
+    store.save("c", _skill("打开设置", "v3"))
+    assert store.get_by_name("打开设置")["description"] == "v1"
+    
+    # 更新描述不改变归属
+    store.save("b", _skill("打开设置", "v2.1"))
+    assert store.get_by_name("打开设置")["description"] == "v1"
+    
+    store.delete("a")
+    assert store.get_by_name("打开设置")["description"] == "v2.1"
+    
+    store.save("b", _skill("打开蓝牙", "v2.2"))
+    assert store.get_by_name("打开设置")["description"] == "v3"
+    assert store.get_by_name("打开蓝牙")["description"] == "v2.2"
+    
+    # 改回原名时按插入顺序重新取得归属
+    store.save("b", _skill("打开设置", "v2.3"))
+    assert store.get_by_name("打开设置")["description"] == "v2.3"
+    assert store.get_by_name("打开蓝牙") is None
+    
+    store.delete("b")
+    store.delete("c")
+    assert store.get_by_name("打开设置") is None
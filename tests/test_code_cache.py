@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+代码缓存测试
+CodeCache 读写/过期/原子写入，以及 SemanticAgent 的缓存策略
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.code_cache import CodeCache
+
+
+# ========== CodeCache ==========
+
+def test_set_get_delete(tmp_path):
+    """测试写入、读取、删除"""
+    cache = CodeCache(str(tmp_path))
+    key = CodeCache.make_key("glm-4-flash", "prompt", "打开设置")
+    
+    assert cache.get(key) is None
+    cache.set(key, "step('打开设置')")
+    assert cache.get(key) == "step('打开设置')"
+    
+    # 新实例读取同一目录
+    assert CodeCache(str(tmp_path)).get(key) == "step('打开设置')"
+    
+    cache.delete(key)
+    assert cache.get(key) is None
+    cache.delete(key)  # 不存在时忽略
+
+
+def test_make_key_depends_on_every_part():
+    """测试 key 随任一字段变化"""
+    key = CodeCache.make_key("glm-4-flash", "prompt", "打开设置")
+    assert key == CodeCache.make_key("glm-4-flash", "prompt", "打开设置")
+    assert key != CodeCache.make_key("glm-4-plus", "prompt", "打开设置")
+    assert key != CodeCache.make_key("glm-4-flash", "prompt2", "打开设置")
+    assert key != CodeCache.make_key("glm-4-flash", "prompt", "打开微信")
+
+
+def test_ttl_expiry(tmp_path, monkeypatch):
+    """测试超过有效期的条目视为未命中"""
+    cache = CodeCache(str(tmp_path), ttl=60)
+    key = CodeCache.make_key("打开设置")
+    cache.set(key, "step('打开设置')")
+    
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 30)
+    assert cache.get(key) == "step('打开设置')"
+    
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert cache.get(key) is None
+
+
+def test_set_is_atomic(tmp_path, monkeypatch):
+    """测试写入不留下临时文件，写入失败时保留旧条目"""
+    cache = CodeCache(str(tmp_path))
+    key = CodeCache.make_key("打开设置")
+    
+    cache.set(key, "step('v1')")
+    cache.set(key, "step('v2')")
+    assert os.listdir(tmp_path) == [f"{key}.json"]
+    assert cache.get(key) == "step('v2')"
+    
+    def broken_replace(src, dst):
+        raise OSError("disk full")
+    
+    monkeypatch.setattr(os, 'replace', broken_replace)
+    cache.set(key, "step('v3')")
+    assert os.listdir(tmp_path) == [f"{key}.json"]
+    assert cache.get(key) == "step('v2')"
+
+
+def test_corrupt_entry_is_miss(tmp_path):
+    """测试损坏的缓存文件视为未命中"""
+    cache = CodeCache(str(tmp_path))
+    key = CodeCache.make_key("打开设置")
+    (tmp_path / f"{key}.json").write_text("{not json", encoding='utf-8')
+    assert cache.get(key) is None
+
+
+# ========== SemanticAgent 缓存策略 ==========
+
+class FakeLLMClient:
+    """记录调用次数的 LLM 客户端"""
+    
+    def __init__(self, code: str):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._code = code
+    
+    def _create(self, **request):
+        self.calls += 1
+        message = SimpleNamespace(content=f"```python\n{self._code}\n```")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeRuntime:
+    """按预设结果返回的运行时"""
+    
+    def __init__(self, success: bool):
+        self.success = success
+        self.executed = []
+    
+    def execute(self, code: str) -> dict:
+        self.executed.append(code)
+        return {
+            'success': self.success,
+            'error': None if self.success else '执行失败',
+            'steps': 1,
+            'retries': 0,
+            'log': [],
+        }
+
+
+def _make_agent(llm_cache_dir=None, success=True):
+    from drivers.mock_driver import MockDriver
+    from main_v3 import SemanticAgent
+    
+    agent = SemanticAgent(
+        zhipuai_api_key="test",
+        driver=MockDriver(),
+        enable_skills=False,
+        llm_cache_dir=llm_cache_dir
+    )
+    agent.llm_client = FakeLLMClient("step('打开设置')")
+    agent.runtime = FakeRuntime(success)
+    return agent
+
+
+def test_agent_cache_disabled_by_default(tmp_path, monkeypatch):
+    """测试默认不启用代码缓存，也不写任何文件"""
+    monkeypatch.chdir(tmp_path)
+    agent = _make_agent()
+    assert agent.code_cache is None
+    
+    agent.execute_task("打开设置")
+    agent.execute_task("打开设置")
+    assert agent.llm_client.calls == 2
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_agent_caches_successful_code(tmp_path):
+    """测试执行成功的代码被缓存，再次执行不调用 LLM"""
+    agent = _make_agent(str(tmp_path / "cache"))
+    
+    assert agent.execute_task("打开设置")['success']
+    assert agent.execute_task("打开设置")['success']
+    assert agent.llm_client.calls == 1
+    assert agent.runtime.executed == ["step('打开设置')"] * 2
+    
+    # bypass_cache 强制重新生成
+    agent.execute_task("打开设置", bypass_cache=True)
+    assert agent.llm_client.calls == 2
+
+
+def test_agent_does_not_cache_failed_code(tmp_path):
+    """测试执行失败的代码不缓存，已缓存的条目执行失败后被删除"""
+    cache_dir = str(tmp_path / "cache")
+    agent = _make_agent(cache_dir, success=False)
+    
+    assert not agent.execute_task("打开设置")['success']
+    assert not agent.execute_task("打开设置")['success']
+    assert agent.llm_client.calls == 2
+    assert os.listdir(cache_dir) == []
+    
+    # 先成功写入缓存，随后命中的缓存代码执行失败
+    agent.runtime.success = True
+    agent.execute_task("打开设置")
+    assert len(os.listdir(cache_dir)) == 1
+    
+    agent.runtime.success = False
+    agent.execute_task("打开设置")
+    assert agent.llm_client.calls == 3
+    assert os.listdir(cache_dir) == []
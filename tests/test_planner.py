@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+规划器测试
+流式代码块收集、代码缓存、代码验证
+"""
+
+import os
+import sys
+
+# 添加项目根目录到 path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from runtime.planner import Planner, _FenceCollector
+from runtime.prompts import validate_code
+
+
+def _feed_all(deltas):
+    """逐段喂入，返回 (停止前读取的文本, 是否提前停止)"""
+    collector = _FenceCollector()
+    for delta in deltas:
+        if collector.feed(delta):
+            return collector.text, True
+    return collector.text, False
+
+
+def test_collector_stops_after_python_block():
+    """测试 python 代码块闭合后立即停止，``` 被拆在两段之间也能识别"""
+    text, stopped = _feed_all(["说明\n``", "`python\nstep('打开设置')\n`", "``", "\n后续说明"])
+    assert stopped
+    assert text.endswith("```")
+    assert Planner(provider='mock')._extract_code(text) == "step('打开设置')"
+
+
+def test_collector_reads_past_other_language_block():
+    """测试先出现的 bash 代码块不会导致提前停止"""
+    deltas = ["```bash\nadb devices\n```\n", "```python\n", "step('返回')\n", "```", "\n结束"]
+    text, stopped = _feed_all(deltas)
+    assert stopped
+    assert "step('返回')" in text
+    assert Planner(provider='mock')._extract_code(text) == "step('返回')"
+
+
+def test_collector_bare_block_needs_step():
+    """测试无语言标记的代码块只有包含 step( 才停止"""
+    _, stopped = _feed_all(["```\nls -l\n```\n", "没有代码"])
+    assert not stopped
+    
+    text, stopped = _feed_all(["```\nstep('点赞')\n```", "\n多余"])
+    assert stopped
+    assert not text.endswith("多余")
+
+
+def _counting_planner(cache_dir):
+    """返回一个不联网的 openai 规划器，LLM 调用替换为 mock 响应并计数"""
+    planner = Planner(provider='openai', cache_dir=cache_dir)
+    calls = []
+    
+    def fake_call(system_prompt, user_message):
+        calls.append(user_message)
+        return planner._mock_response(user_message)
+    
+    planner._call_llm = fake_call
+    return planner, calls
+
+
+def test_planner_cache_hit(tmp_path):
+    """测试相同指令第二次规划命中缓存，不再调用 LLM"""
+    planner, calls = _counting_planner(str(tmp_path))
+    
+    first = planner.plan("打开设置")
+    second = planner.plan("打开设置")
+    
+    assert first.success and second.success
+    assert second.code == first.code
+    assert second.attempts == 0
+    assert len(calls) == 1
+    
+    # 新实例读取同一目录，也能命中
+    other, other_calls = _counting_planner(str(tmp_path))
+    assert other.plan("打开设置").code == first.code
+    assert other_calls == []
+
+
+def test_planner_invalidate_forces_miss(tmp_path):
+    """测试 invalidate() 后重新调用 LLM"""
+    planner, calls = _counting_planner(str(tmp_path))
+    
+    planner.plan("打开设置")
+    planner.invalidate("打开设置")
+    result = planner.plan("打开设置")
+    
+    assert result.success
+    assert result.attempts == 1
+    assert len(calls) == 2
+
+
+def test_planner_cache_disabled_by_default(tmp_path, monkeypatch):
+    """测试默认不启用缓存，mock 模式即使给了目录也不缓存"""
+    monkeypatch.chdir(tmp_path)
+    planner, calls = _counting_planner(None)
+    assert planner.code_cache is None
+    
+    planner.plan("打开设置")
+    planner.plan("打开设置")
+    planner.invalidate("打开设置")
+    assert len(calls) == 2
+    assert list(tmp_path.iterdir()) == []
+    
+    assert Planner(provider='mock', cache_dir=str(tmp_path)).code_cache is None
+
+
+def test_validate_code_reports_patterns_in_list_order():
+    """测试多个模式同时命中时，报错信息按模式列表顺序给出 (而非代码中最先出现的)"""
+    ok, reason = validate_code("step('y=5 再点 100, 200')")
+    assert not ok
+    assert reason == "代码中包含坐标值（匹配: \\b\\d{2,4}\\s*,\\s*\\d{2,4}\\b）"
+    
+    ok, reason = validate_code("step('点击颜色为 #FF0000 的按钮')")
+    assert not ok
+    assert reason == "代码中包含颜色值（匹配: #[0-9A-Fa-f]{6}）"
+    
+    assert validate_code("step('打开设置')") == (True, "代码符合规范")
@@ -20,6 +20,9 @@ from skills.local_store import LocalSkillStore, MockLocalSkillStore
 from skills.remote_store import MockRemoteSkillStore
 from skills.sync_manager import SkillSyncManager
 from skills.skill_manager import SkillManager
+from skills.declarative_skill import (
+    DeclarativeSkill, DeclarativeSkillRegistry, Preference, TriggerCondition
+)
 
 
 class TestSkillDataModel(unittest.TestCase):
@@ -326,6 +329,188 @@ class TestLocalSkillStore(unittest.TestCase):
         self.assertGreater(len(matches), 0)
         self.assertEqual(matches[0].skill.id, "kw1")
 
+    def test_embedding_search(self):
+        """测试嵌入相似度搜索"""
+        vectors = {"朋友圈": [1.0, 0.0, 0.0], "聊天": [0.0, 1.0, 0.0]}
+
+        def fake_embedding(text):
+            for key, vec in vectors.items():
+                if key in text:
+                    return vec
+            return [0.0, 0.0, 1.0]
+
+        self.store._get_embedding = fake_embedding
+        self.store.save(Skill(id="e1", name="微信发朋友圈", description=""))
+        self.store.save(Skill(id="e2", name="微信聊天", description=""))
+        self.store.save(Skill(id="e3", name="支付宝付款", description=""))
+
+        matches = self.store.search("看朋友圈", limit=2)
+
+        self.assertEqual(len(matches), 2)
+        self.assertEqual(matches[0].skill.id, "e1")
+        self.assertAlmostEqual(matches[0].score, 1.0, places=5)
+
+        # 删除后不再出现在结果中
+        self.store.delete("e1")
+        matches = self.store.search("看朋友圈", limit=3)
+        self.assertNotIn("e1", [m.skill.id for m in matches])
+
+    def test_embeddings_quantized_on_disk(self):
+        """测试嵌入以 int8 量化格式持久化"""
+        vector = [0.12, -0.5, 0.33, 0.0]
+        self.store._get_embedding = lambda text: vector
+        self.store.save(Skill(id="q1", name="量化技能", description=""))
+
+        with open(os.path.join(self.temp_dir, "embeddings.json"), 'r') as f:
+            entry = json.load(f)["q1"]
+        self.assertTrue(all(-127 <= v <= 127 for v in entry["q"]))
+
+        # 重新加载后还原为近似的浮点向量
+        new_store = LocalSkillStore(self.temp_dir)
+        for a, b in zip(new_store._embeddings["q1"], vector):
+            self.assertAlmostEqual(a, b, places=2)
+
+    def test_update_stats_does_not_reembed(self):
+        """测试更新统计不会重新生成嵌入"""
+        calls = []
+        self.store._get_embedding = lambda text: calls.append(text) or [1.0, 0.0]
+        self.store.save(Skill(id="u1", name="统计技能", description=""))
+        self.store.update_stats("u1", success=True)
+
+        self.assertEqual(len(calls), 1)
+        skill = LocalSkillStore(self.temp_dir).get("u1")
+        self.assertEqual((skill.use_count, skill.success_count), (1, 1))
+
+    def test_unchanged_text_skips_embedding(self):
+        """测试嵌入文本未变化时（包括重新加载后）不重新生成嵌入"""
+        calls = []
+        fake_embedding = lambda text: calls.append(text) or [1.0, 0.0]
+        skill = Skill(id="h1", name="哈希技能", description="")
+        self.store._get_embedding = fake_embedding
+        self.store.save(skill)
+
+        new_store = LocalSkillStore(self.temp_dir)
+        new_store._get_embedding = fake_embedding
+        new_store.save(skill)
+        self.assertEqual(len(calls), 1)
+
+        skill.description = "描述变化"
+        new_store.save(skill)
+        self.assertEqual(len(calls), 2)
+
+    def test_save_many_writes_index_once(self):
+        """测试批量保存只写一次索引"""
+        writes = []
+        save_index = self.store._save_index
+        self.store._save_index = lambda: (writes.append(1), save_index())
+        self.store.save_many([
+            Skill(id=f"b{i}", name=f"批量技能{i}", description="") for i in range(5)
+        ])
+
+        self.assertEqual(len(writes), 1)
+        new_store = LocalSkillStore(self.temp_dir)
+        self.assertEqual(len(new_store.list_all()), 5)
+
+
+class TestDeclarativeSkill(unittest.TestCase):
+    """测试声明式技能"""
+    
+    def test_prompt_reflects_in_place_changes(self):
+        """测试原地修改偏好、约束后 Prompt 随之更新"""
+        skill = DeclarativeSkill(
+            name="朋友圈点赞",
+            behavior="逐条点赞",
+            preferences=[Preference("截图记录", "保存每步截图")],
+        )
+        self.assertIn("截图记录", skill.to_prompt())
+        
+        skill.preferences[0].enabled = False
+        skill.constraints.append("跳过广告")
+        prompt = skill.to_prompt()
+        self.assertNotIn("截图记录", prompt)
+        self.assertIn("- 跳过广告", prompt)
+        
+        skill.behavior = "只点赞第一条"
+        self.assertIn("只点赞第一条", skill.to_prompt())
+    
+    def test_trigger_changes_affect_matching(self):
+        """测试触发条件被原地修改或重新赋值后匹配随之变化"""
+        trigger = TriggerCondition(keywords=["朋友圈"])
+        self.assertEqual(trigger.matches("打开设置"), 0.0)
+        
+        trigger.keywords.append("设置")
+        self.assertGreater(trigger.matches("打开设置"), 0.0)
+        
+        trigger.keywords = []
+        trigger.intents = ["open wifi"]
+        self.assertGreater(trigger.matches("please open it"), 0.0)
+        
+        skill = DeclarativeSkill(name="旧名称", trigger=TriggerCondition())
+        skill.name = "新名称"
+        self.assertGreater(skill.matches("执行新名称"), 0.0)
+
+
+class TestDeclarativeSkillRegistry(unittest.TestCase):
+    """测试声明式技能注册表的持久化"""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_register_survives_reload(self):
+        """测试注册的技能在重新加载后仍存在（索引 + 日志重放）"""
+        registry = DeclarativeSkillRegistry(self.temp_dir)
+        for i in range(10):
+            registry.register(DeclarativeSkill(id=f"s{i}", name=f"技能{i}"))
+        registry.register(DeclarativeSkill(id="s3", name="改名技能"))
+        
+        reloaded = DeclarativeSkillRegistry(self.temp_dir)
+        
+        self.assertEqual(list(reloaded.skills), list(registry.skills))
+        self.assertEqual(reloaded.get("s3").name, "改名技能")
+        self.assertIsNone(reloaded.find_by_name("技能3"))
+    
+    def test_truncated_journal_entry_is_skipped(self):
+        """测试日志末尾的残缺记录被跳过，且不影响后续注册"""
+        registry = DeclarativeSkillRegistry(self.temp_dir)
+        registry.register(DeclarativeSkill(id="a", name="技能A"))
+        journal = os.path.join(self.temp_dir, DeclarativeSkillRegistry.JOURNAL_FILE)
+        with open(journal, "ab") as f:
+            f.write(b'{"id": "b", "na')
+        
+        recovered = DeclarativeSkillRegistry(self.temp_dir)
+        recovered.register(DeclarativeSkill(id="c", name="技能C"))
+        
+        reloaded = DeclarativeSkillRegistry(self.temp_dir)
+        self.assertEqual(list(reloaded.skills), ["a", "c"])
+    
+    def test_reindex_after_in_place_trigger_change(self):
+        """测试原地修改触发条件后 reindex 使新关键词可被匹配"""
+        registry = DeclarativeSkillRegistry(self.temp_dir)
+        skill = DeclarativeSkill(id="w", name="连接无线", trigger=TriggerCondition(keywords=["wifi"]))
+        registry.register(skill)
+        self.assertEqual(registry.match_intent("打开蓝牙"), [])
+        
+        skill.trigger.keywords.append("蓝牙")
+        self.assertTrue(registry.reindex("w"))
+        self.assertEqual(registry.match_intent("打开蓝牙"), [skill])
+        self.assertEqual(registry.match_intent("打开wifi"), [skill])
+    
+    def test_match_intent_reflects_in_place_changes(self):
+        """测试技能被原地修改后不再返回之前的匹配结果"""
+        registry = DeclarativeSkillRegistry(self.temp_dir)
+        skill = DeclarativeSkill(id="m", name="朋友圈点赞", trigger=TriggerCondition(keywords=["点赞"]))
+        registry.register(skill)
+        self.assertEqual(registry.match_intent("给朋友圈点赞"), [skill])
+        
+        # 不调用 reindex，得分降低也要立即生效
+        skill.trigger.keywords.clear()
+        skill.name = "停用的技能"
+        self.assertEqual(registry.match_intent("给朋友圈点赞"), [])
+
 
 class TestIntegration(unittest.TestCase):
     """集成测试"""